@@ -15,6 +15,8 @@ from flask_cors import CORS
 # 导入业务模块
 from core.crypto_db import CryptoDatabase
 from core.cache_manager import CacheManager
+from core.json_response import init_json
+from core.compression import init_compression
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
@@ -22,6 +24,8 @@ logger = logging.getLogger(__name__)
 
 # 创建Flask应用
 backend_app = Flask(__name__)
+init_json(backend_app)
+init_compression(backend_app)
 CORS(backend_app)
 
 # 初始化组件
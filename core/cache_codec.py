@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""
+缓存值编解码器
+为Redis缓存提供可插拔的序列化格式，K线/图表数据使用紧凑的列式二进制格式
+
+编码后的值带有版本头: MAGIC(2字节) + 格式版本(1字节) + 编解码器ID(1字节) + 标志位(1字节)
+没有版本头的值按旧的JSON文本处理，保证灰度期间旧缓存仍可读取
+
+超过阈值的值会被压缩（优先使用lz4，未安装时使用zlib），并在标志位中记录压缩算法
+"""
+
+import json
+import struct
+import sys
+import zlib
+from array import array
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+# 0xC7 0x1C 不是合法的UTF-8序列，也不可能是JSON文本的开头
+MAGIC = b'\xc7\x1c'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<2sBBB')
+
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+EPOCH = datetime(1970, 1, 1)
+
+# 图表行数据的字段顺序
+CHART_FIELDS = ('symbol', 'date', 'open', 'high', 'low', 'close', 'volume')
+PRICE_FIELDS = ('open', 'high', 'low', 'close', 'volume')
+
+_BIG_ENDIAN = sys.byteorder == 'big'
+
+# 标志位: 压缩算法
+FLAG_ZLIB = 0x01
+FLAG_LZ4 = 0x02
+COMPRESSION_FLAGS = FLAG_ZLIB | FLAG_LZ4
+
+# 默认压缩阈值（字节），小于该值的热点数据（如最新价格）不压缩
+DEFAULT_COMPRESS_THRESHOLD = 8 * 1024
+ZLIB_LEVEL = 6
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:
+    lz4_frame = None
+
+
+class CodecError(ValueError):
+    """值不适用于该编解码器"""
+
+
+def _pack_array(typecode: str, values) -> bytes:
+    """按小端序打包定长数组"""
+    packed = array(typecode, values)
+    if _BIG_ENDIAN:
+        packed.byteswap()
+    return packed.tobytes()
+
+
+def _unpack_array(typecode: str, payload: bytes, offset: int, count: int):
+    """从payload的offset处读取count个定长元素，返回(数组, 新offset)"""
+    values = array(typecode)
+    end = offset + values.itemsize * count
+    values.frombytes(payload[offset:end])
+    if _BIG_ENDIAN:
+        values.byteswap()
+    return values, end
+
+
+class JsonCodec:
+    """JSON编解码器"""
+
+    codec_id = 0
+    name = 'json'
+
+    def encode(self, value: Any) -> bytes:
+        return json.dumps(value, ensure_ascii=False).encode('utf-8')
+
+    def decode(self, payload: bytes) -> Any:
+        return json.loads(payload.decode('utf-8'))
+
+
+class ColumnarCodec:
+    """列式二进制编解码器
+
+    支持两种K线数据形态:
+    - 图表行: [{'symbol', 'date', 'open', 'high', 'low', 'close', 'volume'}, ...]
+    - K线数组: [[timestamp_ms, open, high, low, close, volume], ...]
+
+    时间戳以int64存储，OHLCV以float64列存储，币种使用字符串表去重。
+    """
+
+    codec_id = 1
+    name = 'columnar'
+
+    SHAPE_CHART_ROWS = 1
+    SHAPE_KLINE_ARRAYS = 2
+
+    _COUNT = struct.Struct('<BI')
+    _LENGTH = struct.Struct('<H')
+
+    def encode(self, value: Any) -> bytes:
+        if not isinstance(value, list) or not value:
+            raise CodecError("列式编码只支持非空列表")
+
+        first = value[0]
+        if isinstance(first, dict):
+            return self._encode_chart_rows(value)
+        if isinstance(first, (list, tuple)):
+            return self._encode_kline_arrays(value)
+        raise CodecError(f"不支持的行类型: {type(first).__name__}")
+
+    def decode(self, payload: bytes) -> List:
+        shape, count = self._COUNT.unpack_from(payload, 0)
+        offset = self._COUNT.size
+
+        if shape == self.SHAPE_CHART_ROWS:
+            return self._decode_chart_rows(payload, offset, count)
+        if shape == self.SHAPE_KLINE_ARRAYS:
+            return self._decode_kline_arrays(payload, offset, count)
+        raise CodecError(f"未知的列式数据形态: {shape}")
+
+    def _encode_chart_rows(self, rows: List[Dict]) -> bytes:
+        symbols = []
+        symbol_index = {}
+        indexes = []
+        timestamps = []
+        columns = {field: [] for field in PRICE_FIELDS}
+
+        try:
+            for row in rows:
+                if len(row) != len(CHART_FIELDS):
+                    raise CodecError("图表行包含额外字段")
+
+                symbol = row['symbol']
+                if symbol not in symbol_index:
+                    symbol_index[symbol] = len(symbols)
+                    symbols.append(symbol)
+                indexes.append(symbol_index[symbol])
+
+                date = datetime.strptime(row['date'], DATE_FORMAT)
+                timestamps.append(int((date - EPOCH).total_seconds()))
+
+                for field in PRICE_FIELDS:
+                    columns[field].append(float(row[field]))
+        except (KeyError, TypeError, ValueError) as e:
+            raise CodecError(f"图表行无法列式编码: {e}")
+
+        parts = [self._COUNT.pack(self.SHAPE_CHART_ROWS, len(rows)),
+                 self._LENGTH.pack(len(symbols))]
+        for symbol in symbols:
+            encoded = symbol.encode('utf-8')
+            parts.append(self._LENGTH.pack(len(encoded)))
+            parts.append(encoded)
+        parts.append(_pack_array('H', indexes))
+        parts.append(_pack_array('q', timestamps))
+        for field in PRICE_FIELDS:
+            parts.append(_pack_array('d', columns[field]))
+        return b''.join(parts)
+
+    def _decode_chart_rows(self, payload: bytes, offset: int, count: int) -> List[Dict]:
+        (symbol_count,) = self._LENGTH.unpack_from(payload, offset)
+        offset += self._LENGTH.size
+        symbols = []
+        for _ in range(symbol_count):
+            (length,) = self._LENGTH.unpack_from(payload, offset)
+            offset += self._LENGTH.size
+            symbols.append(payload[offset:offset + length].decode('utf-8'))
+            offset += length
+
+        indexes, offset = _unpack_array('H', payload, offset, count)
+        timestamps, offset = _unpack_array('q', payload, offset, count)
+        columns = []
+        for _ in PRICE_FIELDS:
+            column, offset = _unpack_array('d', payload, offset, count)
+            columns.append(column)
+
+        opens, highs, lows, closes, volumes = columns
+        return [
+            {
+                'symbol': symbols[indexes[i]],
+                'date': (EPOCH + timedelta(seconds=timestamps[i])).strftime(DATE_FORMAT),
+                'open': opens[i],
+                'high': highs[i],
+                'low': lows[i],
+                'close': closes[i],
+                'volume': volumes[i]
+            }
+            for i in range(count)
+        ]
+
+    def _encode_kline_arrays(self, rows: List) -> bytes:
+        try:
+            if any(len(row) != 6 for row in rows):
+                raise CodecError("K线数组必须为 [timestamp, open, high, low, close, volume]")
+            timestamps = [int(row[0]) for row in rows]
+            columns = [[float(row[i]) for row in rows] for i in range(1, 6)]
+        except (TypeError, ValueError) as e:
+            raise CodecError(f"K线数组无法列式编码: {e}")
+
+        parts = [self._COUNT.pack(self.SHAPE_KLINE_ARRAYS, len(rows)),
+                 _pack_array('q', timestamps)]
+        for column in columns:
+            parts.append(_pack_array('d', column))
+        return b''.join(parts)
+
+    def _decode_kline_arrays(self, payload: bytes, offset: int, count: int) -> List[List]:
+        timestamps, offset = _unpack_array('q', payload, offset, count)
+        columns = []
+        for _ in range(5):
+            column, offset = _unpack_array('d', payload, offset, count)
+            columns.append(column)
+        return [list(row) for row in zip(timestamps, *columns)]
+
+
+# 编解码器注册表
+_codecs_by_name: Dict[str, Any] = {}
+_codecs_by_id: Dict[int, Any] = {}
+
+
+def register_codec(codec) -> None:
+    """注册编解码器，codec需提供 codec_id、name、encode()、decode()"""
+    _codecs_by_name[codec.name] = codec
+    _codecs_by_id[codec.codec_id] = codec
+
+
+def get_codec(name: str):
+    """按名称获取编解码器"""
+    if name not in _codecs_by_name:
+        raise KeyError(f"未注册的编解码器: {name}")
+    return _codecs_by_name[name]
+
+
+register_codec(JsonCodec())
+register_codec(ColumnarCodec())
+
+
+def compress(payload: bytes) -> tuple:
+    """压缩数据，返回 (压缩后数据, 标志位)"""
+    if lz4_frame is not None:
+        return lz4_frame.compress(payload), FLAG_LZ4
+    return zlib.compress(payload, ZLIB_LEVEL), FLAG_ZLIB
+
+
+def decompress(payload: bytes, flags: int) -> bytes:
+    """按标志位解压数据"""
+    if flags & FLAG_LZ4:
+        if lz4_frame is None:
+            raise CodecError("缓存值使用lz4压缩，但当前环境未安装lz4")
+        return lz4_frame.decompress(payload)
+    if flags & FLAG_ZLIB:
+        return zlib.decompress(payload)
+    return payload
+
+
+def wrap_payload(payload: bytes, codec_id: int,
+                 compress_threshold: Optional[int] = DEFAULT_COMPRESS_THRESHOLD) -> bytes:
+    """为已编码的数据加上版本头，超过阈值且压缩有效时进行压缩"""
+    flags = 0
+    if compress_threshold is not None and len(payload) >= compress_threshold:
+        compressed, compression_flag = compress(payload)
+        if len(compressed) < len(payload):
+            payload, flags = compressed, compression_flag
+    return HEADER.pack(MAGIC, FORMAT_VERSION, codec_id, flags) + payload
+
+
+def encode_value(value: Any, codec: str = 'json',
+                 compress_threshold: Optional[int] = DEFAULT_COMPRESS_THRESHOLD) -> bytes:
+    """编码缓存值并加上版本头，值不适用于指定编解码器时回退到JSON"""
+    selected = get_codec(codec)
+    try:
+        payload = selected.encode(value)
+    except CodecError:
+        selected = get_codec('json')
+        payload = selected.encode(value)
+    return wrap_payload(payload, selected.codec_id, compress_threshold)
+
+
+def is_encoded(raw: bytes) -> bool:
+    """判断原始值是否带有编解码器版本头"""
+    return raw[:len(MAGIC)] == MAGIC
+
+
+def decode_value(raw: Optional[bytes]) -> Optional[Any]:
+    """解码缓存值，兼容无版本头的旧JSON/纯文本值"""
+    if raw is None:
+        return None
+
+    if is_encoded(raw):
+        _, version, codec_id, flags = HEADER.unpack_from(raw, 0)
+        if version != FORMAT_VERSION:
+            raise CodecError(f"不支持的缓存格式版本: {version}")
+        if codec_id not in _codecs_by_id:
+            raise CodecError(f"未注册的编解码器ID: {codec_id}")
+        if flags & ~COMPRESSION_FLAGS:
+            raise CodecError(f"未知的缓存标志位: {flags:#04x}")
+        payload = decompress(raw[HEADER.size:], flags)
+        return _codecs_by_id[codec_id].decode(payload)
+
+    # 旧格式: JSON文本或纯字符串
+    text = raw.decode('utf-8') if isinstance(raw, bytes) else raw
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        return text
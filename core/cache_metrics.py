@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+缓存指标统计
+按命名空间记录命中、未命中、错误次数、数据量以及读写延迟直方图
+"""
+
+import bisect
+import threading
+from typing import Dict, Optional
+
+# 延迟直方图桶上界（毫秒），最后一个桶为 +inf
+LATENCY_BUCKETS_MS = (0.5, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+
+def namespace_of(key: str) -> str:
+    """从缓存键中提取命名空间
+
+    crypto:{BTC}:chart:hour -> chart
+    crypto:latest_prices    -> latest_prices
+    func:module.name:hash   -> func
+    """
+    parts = key.split(':')
+    if parts[0] == 'crypto' and len(parts) > 1:
+        # 跳过币种哈希标签
+        if parts[1].startswith('{') and len(parts) > 2:
+            return parts[2]
+        return parts[1]
+    return parts[0]
+
+
+class LatencyHistogram:
+    """固定桶的延迟直方图"""
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, ms: float):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+        if ms > self.max_ms:
+            self.max_ms = ms
+
+    def percentile(self, q: float) -> Optional[float]:
+        """按桶上界估算分位数"""
+        if not self.count:
+            return None
+        target = q * self.count
+        cumulative = 0
+        for index, bucket_count in enumerate(self.counts):
+            cumulative += bucket_count
+            if cumulative >= target:
+                return LATENCY_BUCKETS_MS[index] if index < len(LATENCY_BUCKETS_MS) else self.max_ms
+        return self.max_ms
+
+    def snapshot(self) -> Dict:
+        labels = [f"le_{bound}ms" for bound in LATENCY_BUCKETS_MS] + ['le_inf']
+        return {
+            'count': self.count,
+            'avg_ms': round(self.total_ms / self.count, 3) if self.count else 0.0,
+            'max_ms': round(self.max_ms, 3),
+            'p50_ms': self.percentile(0.50),
+            'p95_ms': self.percentile(0.95),
+            'p99_ms': self.percentile(0.99),
+            'buckets': dict(zip(labels, self.counts))
+        }
+
+
+class NamespaceMetrics:
+    """单个命名空间的统计"""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.get_latency = LatencyHistogram()
+        self.set_latency = LatencyHistogram()
+
+    def snapshot(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'errors': self.errors,
+            'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+            'bytes_read': self.bytes_read,
+            'bytes_written': self.bytes_written,
+            'avg_value_bytes': round(self.bytes_read / self.hits) if self.hits else 0,
+            'get_latency': self.get_latency.snapshot(),
+            'set_latency': self.set_latency.snapshot()
+        }
+
+
+class CacheMetrics:
+    """线程安全的缓存指标收集器"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._namespaces: Dict[str, NamespaceMetrics] = {}
+
+    def _namespace(self, key: str) -> NamespaceMetrics:
+        name = namespace_of(key)
+        metrics = self._namespaces.get(name)
+        if metrics is None:
+            metrics = self._namespaces[name] = NamespaceMetrics()
+        return metrics
+
+    def record_get(self, key: str, seconds: Optional[float], size: Optional[int]):
+        """记录一次读取，size为None表示未命中；seconds为None表示不记录延迟（批量读取）"""
+        with self._lock:
+            metrics = self._namespace(key)
+            if size is None:
+                metrics.misses += 1
+            else:
+                metrics.hits += 1
+                metrics.bytes_read += size
+            if seconds is not None:
+                metrics.get_latency.observe(seconds * 1000)
+
+    def record_set(self, key: str, seconds: Optional[float], size: int):
+        """记录一次写入"""
+        with self._lock:
+            metrics = self._namespace(key)
+            metrics.bytes_written += size
+            if seconds is not None:
+                metrics.set_latency.observe(seconds * 1000)
+
+    def record_error(self, key: str):
+        """记录一次缓存操作错误"""
+        with self._lock:
+            self._namespace(key).errors += 1
+
+    def snapshot(self) -> Dict:
+        """导出所有命名空间的统计"""
+        with self._lock:
+            return {name: metrics.snapshot() for name, metrics in sorted(self._namespaces.items())}
+
+    def reset(self):
+        """清空统计"""
+        with self._lock:
+            self._namespaces.clear()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+缓存预热
+入库流程完成后预先计算并写入所有 (币种, 时间周期) 的图表数据、K线指标结果和最新价格，
+使Web端在TTL过期后也几乎不会回源MySQL
+
+图表/K线数据先写入预留的新数据版本的键，全部写好后再发布该版本，
+读取方在切换前后都能命中完整的缓存条目
+"""
+
+import logging
+import time
+
+from crypto_db import CryptoDatabase, format_latest_prices, format_chart_rows
+from crypto_scraper import CRYPTOCURRENCIES
+from simple_redis_manager import get_cache_manager
+from price_stream import publish_prices
+
+logger = logging.getLogger(__name__)
+
+TRACKED_SYMBOLS = list(CRYPTOCURRENCIES.values())
+TRACKED_TIMEFRAMES = ['minute', 'hour', 'day']
+# 与前端页面请求的数据量保持一致
+WARM_LIMIT = 100
+
+
+class CacheWarmer:
+    """缓存预热器"""
+
+    def __init__(self, db=None, cache_manager=None, symbols=None, timeframes=None, limit=WARM_LIMIT):
+        self.db = db or CryptoDatabase()
+        self.cache_manager = cache_manager or get_cache_manager()
+        self.symbols = symbols or TRACKED_SYMBOLS
+        self.timeframes = timeframes or TRACKED_TIMEFRAMES
+        self.limit = limit
+
+    def _with_connection(self, connection, func):
+        """使用传入的连接执行，未传入时从连接池获取并在结束后归还"""
+        if connection:
+            return func(connection)
+
+        connection = self.db.get_connection()
+        if not connection:
+            logger.error("缓存预热获取数据库连接失败")
+            return False
+        try:
+            return func(connection)
+        finally:
+            try:
+                connection.close()
+            except Exception:
+                pass
+
+    def warm_latest_prices(self, connection=None) -> bool:
+        """预热最新价格列表，并推送给订阅了价格频道的Web进程"""
+        def warm(conn):
+            data = self.db.get_latest_prices(connection=conn)
+            if not data:
+                logger.warning("缓存预热: 数据库中没有最新价格数据")
+                return False
+            prices = format_latest_prices(data)
+            cached = self.cache_manager.cache_latest_prices(prices)
+            publish_prices(self.cache_manager.redis, prices)
+            return cached
+
+        return self._with_connection(connection, warm)
+
+    def warm_symbol_timeframe(self, symbol, timeframe, connection=None) -> bool:
+        """预热单个 (币种, 时间周期) 的图表数据与K线指标结果，并发布新的数据版本"""
+        from kline_backend import kline_backend, rows_to_kline
+
+        def warm(conn):
+            data = self.db.get_historical_data(timeframe, symbol, self.limit, connection=conn)
+            if not data:
+                logger.warning(f"缓存预热: 没有 {symbol} 的 {timeframe} 级数据")
+                return False
+
+            # 先预留版本号，期间的失效会分配更大的版本，不会被这次发布覆盖
+            version = self.cache_manager.reserve_data_version(symbol, timeframe)
+            if version is None:
+                return False
+            chart_ok = self.cache_manager.cache_chart_data(
+                symbol, timeframe, format_chart_rows(data), version=version,
+                complete=len(data) < self.limit)
+
+            kline_data = rows_to_kline(data)
+            self.cache_manager.cache_kline_data(symbol, timeframe, kline_data, version=version)
+
+            # 与Web端数据库路径一样只在最近limit根K线上计算指标
+            payload = kline_backend.build_kline_payload(kline_data, self.limit)
+            kline_ok = self.cache_manager.cache_kline_payload(
+                symbol, timeframe, self.limit, payload, version=version)
+
+            # 即使部分写入失败也要发布新版本，避免继续读到入库前的旧数据
+            self.cache_manager.publish_data_version(symbol, timeframe, version)
+            return chart_ok and kline_ok
+
+        return self._with_connection(connection, warm)
+
+    def warm_all(self, connection=None) -> dict:
+        """预热所有跟踪的币种和时间周期，返回每项的预热结果"""
+        started = time.time()
+        results = {'latest_prices': self.warm_latest_prices(connection)}
+
+        for symbol in self.symbols:
+            for timeframe in self.timeframes:
+                try:
+                    results[f"{symbol}:{timeframe}"] = self.warm_symbol_timeframe(symbol, timeframe, connection)
+                except Exception as e:
+                    logger.error(f"缓存预热失败 {symbol} {timeframe}: {e}")
+                    results[f"{symbol}:{timeframe}"] = False
+
+        warmed = sum(1 for ok in results.values() if ok)
+        logger.info(f"缓存预热完成: {warmed}/{len(results)} 项，耗时 {time.time() - started:.2f}s")
+        return results
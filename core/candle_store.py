@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Redis时间序列K线存储
+每个 (币种, 时间周期) 使用一个有序集合 crypto:{SYMBOL}:ts:{timeframe} 保存最近的K线，
+score为K线时间戳（秒）。入库流程追加新K线并裁剪到固定深度，Web端通过 ZRANGEBYSCORE 按范围读取
+"""
+
+import json
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+import logging
+
+from cache_codec import EPOCH, DATE_FORMAT
+from simple_redis_manager import get_cache_manager, symbol_key
+
+logger = logging.getLogger(__name__)
+
+# 每个序列保留的K线数量
+DEFAULT_DEPTH = 500
+# 序列在没有写入时的保留时间，避免废弃币种的数据长期占用内存
+SERIES_EXPIRE = 7 * 24 * 3600
+
+# 只补充序列中还没有的时间戳，已有的K线（入库流程追加的更新数据）保持不变，返回补充后的K线数量
+# KEYS[1]: 序列  ARGV: score1, member1, score2, member2, ...
+SEED_SCRIPT = """
+for i = 1, #ARGV, 2 do
+    if redis.call('ZCOUNT', KEYS[1], ARGV[i], ARGV[i]) == 0 then
+        redis.call('ZADD', KEYS[1], ARGV[i], ARGV[i + 1])
+    end
+end
+return redis.call('ZCARD', KEYS[1])
+"""
+
+
+def to_epoch_seconds(date) -> int:
+    """把K线时间（datetime/pandas.Timestamp/字符串）转换为与缓存一致的秒级时间戳"""
+    if isinstance(date, str):
+        date = datetime.strptime(date, DATE_FORMAT)
+    return int((date - EPOCH).total_seconds())
+
+
+class CandleStore:
+    """基于Redis有序集合的K线时间序列存储
+
+    成员为紧凑JSON数组 [ts, open, high, low, close, volume]，
+    同一时间戳的K线（未收盘K线的更新）会替换旧成员。
+    """
+
+    def __init__(self, redis_manager=None, depth: int = DEFAULT_DEPTH):
+        self.redis = redis_manager or get_cache_manager().redis
+        self.depth = depth
+
+    @staticmethod
+    def series_key(symbol: str, timeframe: str) -> str:
+        return symbol_key(symbol, "ts", timeframe)
+
+    @staticmethod
+    def complete_key(symbol: str, timeframe: str) -> str:
+        """标记序列已包含数据库中的全部数据（数据库数据不足深度时）"""
+        return symbol_key(symbol, "ts", timeframe, "complete")
+
+    @staticmethod
+    def _member(candle) -> tuple:
+        """把 (date, open, high, low, close, volume) 转换为 (member, score)"""
+        date, open_price, high_price, low_price, close_price, volume = candle
+        ts = to_epoch_seconds(date)
+        member = json.dumps([ts, float(open_price), float(high_price), float(low_price),
+                             float(close_price), float(volume or 0)], separators=(',', ':'))
+        return member, ts
+
+    def append(self, symbol: str, timeframe: str, candles: List) -> bool:
+        """追加K线并裁剪到固定深度，开销与新增K线数量成正比
+
+        candles: [(date, open, high, low, close, volume), ...]
+        """
+        client = self.redis.redis_client
+        if not client or not candles:
+            return False
+
+        key = self.series_key(symbol, timeframe)
+        try:
+            pipe = self.redis.pipeline(transaction=True)
+            for candle in candles:
+                member, ts = self._member(candle)
+                pipe.zremrangebyscore(key, ts, ts)
+                pipe.zadd(key, {member: ts})
+            pipe.zremrangebyrank(key, 0, -(self.depth + 1))
+            pipe.expire(key, SERIES_EXPIRE)
+            trimmed = pipe.execute()[-2]
+            # 裁剪掉旧K线后序列不再包含全部历史
+            if trimmed:
+                client.delete(self.complete_key(symbol, timeframe))
+            return True
+        except Exception as e:
+            logger.error(f"追加K线序列失败 {key}: {e}")
+            return False
+
+    def seed(self, symbol: str, timeframe: str, candles: List, complete: bool = False) -> bool:
+        """用数据库数据补齐序列
+
+        只写入序列中还没有的时间戳，不删除已有数据: 读库期间入库流程追加的K线不会被覆盖。
+        complete=True 表示数据库中的数据少于请求数量，序列已包含全部历史；
+        数据超过深度被裁剪时不标记为完整。
+        """
+        client = self.redis.redis_client
+        if not client:
+            return False
+
+        key = self.series_key(symbol, timeframe)
+        complete_key = self.complete_key(symbol, timeframe)
+        try:
+            args = []
+            for candle in candles:
+                member, ts = self._member(candle)
+                args.extend((ts, member))
+            count = client.eval(SEED_SCRIPT, 1, key, *args) if args else 0
+            pipe = self.redis.pipeline(transaction=True)
+            if args:
+                pipe.zremrangebyrank(key, 0, -(self.depth + 1))
+                pipe.expire(key, SERIES_EXPIRE)
+            if complete and count <= self.depth:
+                pipe.setex(complete_key, SERIES_EXPIRE, 1)
+            else:
+                pipe.delete(complete_key)
+            pipe.execute()
+            return True
+        except Exception as e:
+            logger.error(f"初始化K线序列失败 {key}: {e}")
+            return False
+
+    def get_latest(self, symbol: str, timeframe: str, limit: int) -> Optional[List[List]]:
+        """读取最近limit根K线（按时间升序）
+
+        序列中的数据不足limit且未标记为完整时返回None，由调用方回源数据库。
+        """
+        client = self.redis.redis_client
+        if not client:
+            return None
+
+        key = self.series_key(symbol, timeframe)
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.zrevrangebyscore(key, '+inf', '-inf', start=0, num=limit)
+            pipe.exists(self.complete_key(symbol, timeframe))
+            members, complete = pipe.execute()
+        except Exception as e:
+            logger.error(f"读取K线序列失败 {key}: {e}")
+            return None
+
+        if not members or (len(members) < limit and not complete):
+            return None
+        return [json.loads(member) for member in reversed(members)]
+
+    def get_range(self, symbol: str, timeframe: str, start=None, end=None) -> List[List]:
+        """按时间范围读取K线（秒级时间戳，闭区间），按时间升序"""
+        client = self.redis.redis_client
+        if not client:
+            return []
+
+        key = self.series_key(symbol, timeframe)
+        try:
+            members = client.zrangebyscore(key, '-inf' if start is None else start,
+                                           '+inf' if end is None else end)
+            return [json.loads(member) for member in members]
+        except Exception as e:
+            logger.error(f"读取K线序列失败 {key}: {e}")
+            return []
+
+
+def to_chart_rows(symbol: str, candles: List[List]) -> List[Dict]:
+    """把序列中的K线转换为Web端图表行格式，按时间倒序（最新在前），与数据库查询结果一致"""
+    return [
+        {
+            'symbol': symbol.upper(),
+            'date': (EPOCH + timedelta(seconds=ts)).strftime(DATE_FORMAT),
+            'open': open_price,
+            'high': high_price,
+            'low': low_price,
+            'close': close_price,
+            'volume': volume
+        }
+        for ts, open_price, high_price, low_price, close_price, volume in reversed(candles)
+    ]
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+响应压缩
+按 Accept-Encoding 协商对JSON/文本响应进行压缩（安装了brotli时优先使用br，否则gzip）
+
+- 小于阈值的响应、非200响应、流式响应（SSE）和已编码的响应不压缩
+- 压缩后的内容按 (编码, ETag) 缓存在进程内LRU中，没有ETag的响应按内容摘要缓存，
+  同一份数据被反复请求时直接返回缓存的压缩结果，不再重复压缩
+- 压缩后的响应ETag加上编码后缀（"etag-gzip"），条件请求时由 http_cache 识别
+"""
+
+import gzip
+import hashlib
+import os
+import logging
+
+from flask import request
+
+from local_cache import LocalCache
+from http_cache import ENCODING_ETAG_SUFFIX
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# 小于该字节数的响应不压缩
+DEFAULT_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', '1024'))
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+# 压缩结果缓存的条目数和保留时间（秒）
+COMPRESSED_CACHE_ENTRIES = 256
+COMPRESSED_CACHE_TTL = 600
+
+COMPRESSIBLE_MIMETYPES = ('application/json', 'application/javascript', 'text/html', 'text/css',
+                          'text/plain', 'text/javascript', 'image/svg+xml')
+
+
+def _gzip(data: bytes) -> bytes:
+    # mtime固定为0，相同内容的压缩结果字节一致
+    return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def _brotli(data: bytes) -> bytes:
+    return brotli.compress(data, quality=BROTLI_QUALITY)
+
+
+# 按优先级排列的可用编码
+ENCODERS = ([('br', _brotli)] if brotli is not None else []) + [('gzip', _gzip)]
+
+
+class ResponseCompressor:
+    """Flask after_request 压缩处理"""
+
+    def __init__(self, min_size: int = DEFAULT_MIN_SIZE):
+        self.min_size = min_size
+        self.cache = LocalCache(COMPRESSED_CACHE_ENTRIES, COMPRESSED_CACHE_TTL)
+
+    def init_app(self, app):
+        app.after_request(self.after_request)
+        return app
+
+    @staticmethod
+    def choose_encoding():
+        """选择客户端接受的优先级最高的编码"""
+        for name, encoder in ENCODERS:
+            if request.accept_encodings[name] > 0:
+                return name, encoder
+        return None, None
+
+    def _compressible(self, response) -> bool:
+        return (response.status_code == 200
+                and not response.direct_passthrough
+                and not response.is_streamed
+                and 'Content-Encoding' not in response.headers
+                and response.mimetype in COMPRESSIBLE_MIMETYPES)
+
+    def after_request(self, response):
+        if response.status_code == 304 and response.get_etag()[0]:
+            # 304与对应的200响应使用相同的Vary
+            response.vary.add('Accept-Encoding')
+        if not self._compressible(response):
+            return response
+
+        response.vary.add('Accept-Encoding')
+        name, encoder = self.choose_encoding()
+        if name is None:
+            return response
+
+        data = response.get_data()
+        if len(data) < self.min_size:
+            return response
+
+        etag, weak = response.get_etag()
+        cache_key = f"{name}:{etag}" if etag and not weak else f"{name}:#{hashlib.sha1(data).hexdigest()}"
+        compressed = self.cache.get(cache_key)
+        if compressed is None:
+            try:
+                compressed = encoder(data)
+            except Exception as e:
+                logger.warning(f"响应压缩失败 ({name}): {e}")
+                return response
+            self.cache.set(cache_key, compressed)
+
+        if len(compressed) >= len(data):
+            return response
+
+        response.set_data(compressed)
+        response.headers['Content-Encoding'] = name
+        if etag:
+            response.set_etag(f"{etag}{ENCODING_ETAG_SUFFIX[name]}", weak=weak)
+        return response
+
+
+def init_compression(app, min_size: int = DEFAULT_MIN_SIZE):
+    """为Flask应用启用响应压缩"""
+    return ResponseCompressor(min_size).init_app(app)
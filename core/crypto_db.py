@@ -444,8 +444,8 @@ class CryptoDatabase:
             # 使用原有的execute_query方法（向后兼容）
             return self.execute_query(query, fetch=True)
     
-    def get_historical_data(self, timeframe, symbol=None, limit=100, connection=None):
-        """获取历史数据"""
+    def get_historical_data(self, timeframe, symbol=None, limit=100, connection=None, before=None):
+        """获取历史数据（按时间倒序），指定before时只返回该时间之前的数据"""
         table_map = {
             'minute': 'minute_data',
             'hour': 'hour_data',
@@ -457,23 +457,24 @@ class CryptoDatabase:
         
         table_name = table_map[timeframe]
         
+        conditions = []
+        params = []
         if symbol:
-            query = f"""
-            SELECT symbol, date, open_price, high_price, low_price, close_price, volume
-            FROM {table_name}
-            WHERE symbol = %s
-            ORDER BY date DESC
-            LIMIT %s
-            """
-            params = (symbol, limit)
-        else:
-            query = f"""
-            SELECT symbol, date, open_price, high_price, low_price, close_price, volume
-            FROM {table_name}
-            ORDER BY date DESC
-            LIMIT %s
-            """
-            params = (limit,)
+            conditions.append("symbol = %s")
+            params.append(symbol)
+        if before is not None:
+            conditions.append("date < %s")
+            params.append(before)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        
+        query = f"""
+        SELECT symbol, date, open_price, high_price, low_price, close_price, volume
+        FROM {table_name}
+        {where}
+        ORDER BY date DESC
+        LIMIT %s
+        """
+        params = tuple(params) + (limit,)
         
         if connection:
             # 使用传入的连接
@@ -490,6 +491,37 @@ class CryptoDatabase:
             # 使用原有的execute_query方法（向后兼容）
             return self.execute_query(query, params, fetch=True)
 
+def format_latest_prices(data):
+    """把 get_latest_prices 的查询结果转换为API/缓存使用的字典列表"""
+    result = []
+    for item in data:
+        name, symbol, price, change_24h, timestamp = item
+        result.append({
+            'name': name,
+            'symbol': symbol,
+            'price': float(price),
+            'change_24h': float(change_24h) if change_24h is not None else 0.0,
+            'timestamp': timestamp.strftime('%Y-%m-%d %H:%M:%S') if hasattr(timestamp, 'strftime') else str(timestamp)
+        })
+    return result
+
+def format_chart_rows(data):
+    """把 get_historical_data 的查询结果转换为API/缓存使用的图表行"""
+    result = []
+    for item in data:
+        # 数据库返回的是tuple格式: (symbol, date, open_price, high_price, low_price, close_price, volume)
+        symbol_name, date, open_price, high_price, low_price, close_price, volume = item
+        result.append({
+            'symbol': symbol_name,
+            'date': date.strftime('%Y-%m-%d %H:%M:%S') if hasattr(date, 'strftime') else str(date),
+            'open': float(open_price),
+            'high': float(high_price),
+            'low': float(low_price),
+            'close': float(close_price),
+            'volume': float(volume) if volume is not None else 0.0
+        })
+    return result
+
 def rebuild_database():
     """重建数据库结构"""
     db = CryptoDatabase()
@@ -1,14 +1,79 @@
-from flask import Flask, render_template, jsonify, request
+from flask import Flask, Response, render_template, jsonify, request
 import logging
 from datetime import datetime
 import os
-from crypto_db import CryptoDatabase
+import numpy as np
+from crypto_db import CryptoDatabase, format_latest_prices, format_chart_rows
 from crypto_analyzer import CryptoAnalyzer
 from simple_redis_manager import CryptoCacheManager
+from candle_store import CandleStore, to_chart_rows
+from cache_codec import DATE_FORMAT
+from json_response import init_json
+from compression import init_compression
+from price_stream import PriceBroadcaster
+from http_cache import conditional_response, request_etag, rows_watermark
+import indicators
 
 # 配置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# 图表曲线中波动率的默认滑动窗口
+VOLATILITY_WINDOW = 10
+CHART_COLUMNS = ('symbol', 'date', 'open', 'high', 'low', 'close', 'volume')
+# 列式返回格式的列名
+COMPACT_COLUMNS = (('t', 'date'), ('o', 'open'), ('h', 'high'), ('l', 'low'), ('c', 'close'), ('v', 'volume'))
+RESPONSE_FORMATS = ('rows', 'columns')
+
+def rows_to_columns(rows):
+    """一次遍历把图表行转换为列式数据"""
+    columns = {name: [] for name in CHART_COLUMNS}
+    appenders = [(name, columns[name].append) for name in CHART_COLUMNS]
+    for row in rows:
+        for name, append in appenders:
+            append(row[name])
+    return columns
+
+def parse_timestamp_ms(raw, name='since'):
+    """解析毫秒时间戳参数（与K线时间戳相同，按本地时间）
+    
+    也接受 '%Y-%m-%d %H:%M:%S' 格式的本地时间，不合法时抛出 ValueError。
+    """
+    if raw is None:
+        return None
+    try:
+        return int(raw)
+    except ValueError:
+        pass
+    try:
+        return int(datetime.strptime(raw, DATE_FORMAT).timestamp() * 1000)
+    except ValueError:
+        raise ValueError(f"{name}参数不合法: {raw}")
+
+def parse_since(raw):
+    """解析图表接口的since参数（毫秒时间戳），返回可与图表行date直接比较的字符串"""
+    since = parse_timestamp_ms(raw)
+    if since is None:
+        return None
+    try:
+        return datetime.fromtimestamp(since / 1000).strftime(DATE_FORMAT)
+    except (ValueError, OverflowError, OSError):
+        raise ValueError(f"since参数不合法: {raw}")
+
+def parse_response_format(raw):
+    """解析format参数（rows/columns），不合法时抛出 ValueError"""
+    response_format = (raw or 'rows').lower()
+    if response_format not in RESPONSE_FORMATS:
+        raise ValueError(f"format参数不合法: {raw}")
+    return response_format
+
+def rows_to_compact(rows, with_symbol=False):
+    """把图表行转换为列式数据 {t: [...], o: [...], h: [...], l: [...], c: [...], v: [...]}"""
+    columns = rows_to_columns(rows)
+    result = {short: columns[name] for short, name in COMPACT_COLUMNS}
+    if with_symbol:
+        result['s'] = columns['symbol']
+    return result
+
 class CryptoWebApp:
     def __init__(self):
         # 获取项目根目录路径
@@ -27,16 +92,26 @@ class CryptoWebApp:
         self.app = Flask(__name__, 
                         template_folder=template_folder,
                         static_folder=static_folder)
+        init_json(self.app)
+        init_compression(self.app)
         self.db = CryptoDatabase()
         self.analyzer = CryptoAnalyzer()
         
         # 初始化Redis缓存管理器
         try:
-            self.redis_manager = CryptoCacheManager()
+            # 启用进程内L1缓存，并订阅失效频道保持各Web进程一致
+            self.redis_manager = CryptoCacheManager(local_cache=True)
+            self.redis_manager.start_invalidation_listener()
+            self.candle_store = CandleStore(self.redis_manager.redis)
+            # 每个进程一个价格频道订阅线程，向所有SSE客户端分发
+            self.price_broadcaster = PriceBroadcaster(self.redis_manager.redis)
+            self.price_broadcaster.start()
             logging.info("Redis缓存管理器初始化成功")
         except Exception as e:
             logging.warning(f"Redis缓存管理器初始化失败: {e}")
             self.redis_manager = None
+            self.candle_store = None
+            self.price_broadcaster = None
             
         self.setup_routes()
     
@@ -47,6 +122,7 @@ class CryptoWebApp:
         self.app.route('/ethereum')(self.ethereum)
         self.app.route('/kline')(self.kline)
         self.app.route('/api/latest_prices')(self.api_latest_prices)
+        self.app.route('/api/stream/prices')(self.api_price_stream)
         self.app.route('/api/chart_data')(self.api_chart_data)
         self.app.route('/api/btc_data')(self.api_btc_data)
         self.app.route('/api/eth_data')(self.api_eth_data)
@@ -57,67 +133,65 @@ class CryptoWebApp:
         self.app.route('/api/cache/stats')(self.api_cache_stats)
         self.app.route('/api/cache/clear', methods=['POST'])(self.api_clear_cache)
     
-    def process_chart_data(self, data, symbol):
-        """处理图表数据，计算三条曲线：价格、成交量、波动率"""
+    def process_chart_data(self, data, symbol, window=VOLATILITY_WINDOW):
+        """处理图表数据，计算三条曲线：价格、成交量、波动率
+        
+        data 可以是图表行列表，也可以是列式数据 {'date': [...], 'close': [...], ...}。
+        波动率为最近window个收盘价的总体标准差，使用向量化的滚动均值/标准差，O(n)。
+        """
+        empty = {
+            'price_data': [],
+            'volume_data': [],
+            'volatility_data': []
+        }
         if not data:
-            return {
-                'price_data': [],
-                'volume_data': [],
-                'volatility_data': []
-            }
+            return empty
+        
+        columns = data if isinstance(data, dict) else rows_to_columns(data)
         
         # 过滤指定symbol的数据
-        filtered_data = [item for item in data if item['symbol'] == symbol]
+        index = np.arange(len(columns['date']))
+        if columns.get('symbol') is not None:
+            index = np.flatnonzero(np.asarray(columns['symbol']) == symbol)
+            if len(index) == 0:
+                return empty
         
-        if not filtered_data:
-            return {
-                'price_data': [],
-                'volume_data': [],
-                'volatility_data': []
-            }
+        # 按时间升序排列（图表数据为倒序，已有序时不再排序）
+        dates = np.asarray(columns['date'])[index]
+        if len(dates) > 1 and not (dates[1:] >= dates[:-1]).all():
+            if (dates[1:] <= dates[:-1]).all():
+                index = index[::-1]
+            else:
+                index = index[np.argsort(dates, kind='stable')]
         
-        # 按时间排序
-        filtered_data.sort(key=lambda x: x['date'])
+        def column(name):
+            return np.asarray(columns[name], dtype=np.float64)[index]
         
-        # 准备三条曲线的数据
-        price_data = []
-        volume_data = []
-        volatility_data = []
+        dates = np.asarray(columns['date'])[index].tolist()
+        closes = column('close')
         
         # 计算移动平均和波动率的窗口大小
-        window_size = min(10, len(filtered_data))
+        window_size = max(1, min(window, len(closes)))
+        mean_prices = indicators.sma(closes, window_size)
+        volatilities = indicators.rolling_std(closes, window_size, ddof=0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            volatility_percents = np.where(mean_prices > 0, volatilities / mean_prices * 100, 0.0)
         
-        for i, item in enumerate(filtered_data):
-            # 价格数据
-            price_data.append({
-                'date': item['date'],
-                'price': item['close'],
-                'high': item['high'],
-                'low': item['low'],
-                'open': item['open']
-            })
-            
-            # 成交量数据
-            volume_data.append({
-                'date': item['date'],
-                'volume': item['volume']
-            })
-            
-            # 计算波动率（使用滑动窗口）
-            if i >= window_size - 1:
-                # 获取窗口内的价格数据
-                window_prices = [filtered_data[j]['close'] for j in range(i - window_size + 1, i + 1)]
-                
-                # 计算标准差作为波动率
-                mean_price = sum(window_prices) / len(window_prices)
-                variance = sum((price - mean_price) ** 2 for price in window_prices) / len(window_prices)
-                volatility = variance ** 0.5
-                
-                volatility_data.append({
-                    'date': item['date'],
-                    'volatility': volatility,
-                    'volatility_percent': (volatility / mean_price) * 100 if mean_price > 0 else 0
-                })
+        price_data = [
+            {'date': date, 'price': close, 'high': high, 'low': low, 'open': open_price}
+            for date, close, high, low, open_price in zip(
+                dates, closes.tolist(), column('high').tolist(), column('low').tolist(), column('open').tolist())
+        ]
+        volume_data = [
+            {'date': date, 'volume': volume}
+            for date, volume in zip(dates, column('volume').tolist())
+        ]
+        start = window_size - 1
+        volatility_data = [
+            {'date': date, 'volatility': volatility, 'volatility_percent': percent}
+            for date, volatility, percent in zip(
+                dates[start:], volatilities[start:].tolist(), volatility_percents[start:].tolist())
+        ]
         
         return {
             'price_data': price_data,
@@ -156,16 +230,7 @@ class CryptoWebApp:
                 return []
             
             # 转换数据格式
-            result = []
-            for item in data:
-                name, symbol, price, change_24h, timestamp = item
-                result.append({
-                    'name': name,
-                    'symbol': symbol,
-                    'price': float(price),
-                    'change_24h': float(change_24h) if change_24h is not None else 0.0,
-                    'timestamp': timestamp.strftime('%Y-%m-%d %H:%M:%S') if hasattr(timestamp, 'strftime') else str(timestamp)
-                })
+            result = format_latest_prices(data)
             
             # 将数据缓存到Redis（缓存60秒）
             if self.redis_manager and result:
@@ -190,18 +255,34 @@ class CryptoWebApp:
 
     
     def get_chart_data(self, timeframe, symbol=None, limit=100):
-        """从缓存或数据库获取图表数据"""
-        # 首先尝试从Redis缓存获取
+        """从缓存或数据库获取图表数据，按时间倒序（最新在前）"""
+        # 优先从Redis K线时间序列读取最近的K线
+        if self.candle_store and symbol:
+            try:
+                candles = self.candle_store.get_latest(symbol, timeframe, limit)
+                if candles:
+                    logging.info(f"从Redis时间序列获取{symbol}的{timeframe}图表数据")
+                    return to_chart_rows(symbol, candles)
+            except Exception as e:
+                logging.warning(f"从Redis时间序列获取图表数据失败: {e}")
+        
+        # 其次尝试从Redis缓存的图表窗口中截取（先读取数据版本，回源后写入同一版本）
+        version = None
+        window = None
         if self.redis_manager and symbol:
             try:
-                cached_data = self.redis_manager.get_chart_data(symbol, timeframe)
-                if cached_data:
+                version = self.redis_manager.get_data_version(symbol, timeframe)
+                window, complete = self.redis_manager.get_chart_window(symbol, timeframe, version=version)
+                if window and (len(window) >= limit or complete):
                     logging.info(f"从Redis缓存获取{symbol}的{timeframe}图表数据")
-                    return cached_data
+                    return window[:limit]
+                elif window:
+                    logging.info(f"Redis缓存中{symbol}的{timeframe}图表窗口只有{len(window)}条，从数据库补齐")
                 else:
                     logging.info(f"Redis缓存中没有{symbol}的{timeframe}图表数据，从数据库获取")
             except Exception as e:
                 logging.warning(f"从Redis缓存获取图表数据失败: {e}")
+                window = None
         
         # 从数据库获取数据
         connection = None
@@ -212,36 +293,39 @@ class CryptoWebApp:
                 logging.error("数据库连接失败")
                 return []
             
-            # 获取历史数据
-            data = self.db.get_historical_data(timeframe, symbol, limit, connection=connection)
-            
-            if not data or len(data) == 0:
-                logging.warning(f"数据库中没有{timeframe}级数据")
-                return []
-            
-            # 转换数据格式
-            result = []
-            for item in data:
-                # 数据库返回的是tuple格式: (symbol, date, open_price, high_price, low_price, close_price, volume)
-                symbol_name, date, open_price, high_price, low_price, close_price, volume = item
-                result.append({
-                    'symbol': symbol_name,
-                    'date': date.strftime('%Y-%m-%d %H:%M:%S') if hasattr(date, 'strftime') else str(date),
-                    'open': float(open_price),
-                    'high': float(high_price),
-                    'low': float(low_price),
-                    'close': float(close_price),
-                    'volume': float(volume) if volume is not None else 0.0
-                })
+            # 已有缓存窗口时只查询窗口之前缺少的部分
+            if window:
+                missing = limit - len(window)
+                data = self.db.get_historical_data(timeframe, symbol, missing,
+                                                   connection=connection, before=window[-1]['date'])
+                result = window + format_chart_rows(data or [])
+                complete = len(data or []) < missing
+            else:
+                data = self.db.get_historical_data(timeframe, symbol, limit, connection=connection)
+                
+                if not data or len(data) == 0:
+                    logging.warning(f"数据库中没有{timeframe}级数据")
+                    return []
+                
+                # 转换数据格式
+                result = format_chart_rows(data)
+                complete = len(data) < limit
             
-            # 将数据缓存到Redis（缓存5分钟）
+            # 将扩展后的窗口缓存到Redis，之后更小的limit都从窗口中截取
             if self.redis_manager and result and symbol:
                 try:
-                    self.redis_manager.cache_chart_data(symbol, timeframe, result)
+                    self.redis_manager.cache_chart_data(symbol, timeframe, result, version=version,
+                                                        complete=complete)
                     logging.info(f"{symbol}的{timeframe}图表数据已缓存到Redis")
                 except Exception as e:
                     logging.warning(f"缓存图表数据到Redis失败: {e}")
             
+            # 用数据库数据初始化时间序列，之后由入库流程增量追加
+            if self.candle_store and symbol:
+                candles = [(row['date'], row['open'], row['high'], row['low'], row['close'], row['volume'])
+                           for row in result]
+                self.candle_store.seed(symbol, timeframe, candles, complete=complete)
+            
             return result
         except Exception as e:
             logging.error(f"获取图表数据时出错: {str(e)}")
@@ -327,10 +411,10 @@ class CryptoWebApp:
         """API: 获取最新价格"""
         try:
             prices = self.get_latest_prices()
-            return jsonify({
+            return conditional_response(request_etag(prices), lambda: jsonify({
                 'success': True,
                 'data': prices
-            })
+            }))
         except Exception as e:
             logging.error(f"API获取最新价格时出错: {str(e)}")
             return jsonify({
@@ -338,6 +422,26 @@ class CryptoWebApp:
                 'error': str(e)
             }), 500
     
+    def api_price_stream(self):
+        """API: 以Server-Sent Events推送最新价格"""
+        # Redis不可用时返回503，页面收到后回退到轮询
+        if self.price_broadcaster is None or not self.price_broadcaster.is_available():
+            return jsonify({
+                'success': False,
+                'error': '实时推送不可用'
+            }), 503
+        
+        if self.price_broadcaster.is_full():
+            return jsonify({
+                'success': False,
+                'error': '实时推送连接数已满'
+            }), 503
+        
+        return Response(self.price_broadcaster.stream(), mimetype='text/event-stream', headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        })
+    
     def api_chart_data(self):
         """API: 获取图表数据"""
         try:
@@ -345,11 +449,27 @@ class CryptoWebApp:
             symbol = request.args.get('symbol')
             limit = int(request.args.get('limit', 100))
             
+            # since=<时间> 只返回不早于该时间的K线，format=columns 返回列式数据
+            try:
+                since = parse_since(request.args.get('since'))
+                response_format = parse_response_format(request.args.get('format'))
+            except ValueError as e:
+                return jsonify({
+                    'success': False,
+                    'error': str(e)
+                }), 400
+            
             data = self.get_chart_data(timeframe, symbol, limit)
-            return jsonify({
-                'success': True,
-                'data': data
-            })
+            if since is not None:
+                data = [row for row in data if row['date'] >= since]
+            
+            def build():
+                return jsonify({
+                    'success': True,
+                    'data': rows_to_compact(data, symbol is None) if response_format == 'columns' else data
+                })
+            
+            return conditional_response(request_etag(rows_watermark(data)), build)
         except Exception as e:
             logging.error(f"API获取图表数据时出错: {str(e)}")
             return jsonify({
@@ -363,16 +483,16 @@ class CryptoWebApp:
             timeframe = request.args.get('timeframe', 'hour')
             limit = int(request.args.get('limit', 100))
             
+            window = int(request.args.get('window', VOLATILITY_WINDOW))
+            
             # 获取原始数据
             raw_data = self.get_chart_data(timeframe, 'BTC', limit)
             
-            # 处理数据，生成三条曲线
-            processed_data = self.process_chart_data(raw_data, 'BTC')
-            
-            return jsonify({
+            # 处理数据，生成三条曲线（数据未变化时直接返回304，不再计算）
+            return conditional_response(request_etag(rows_watermark(raw_data)), lambda: jsonify({
                 'success': True,
-                'data': processed_data
-            })
+                'data': self.process_chart_data(raw_data, 'BTC', window)
+            }))
         except Exception as e:
             logging.error(f"API获取比特币数据时出错: {str(e)}")
             return jsonify({
@@ -386,16 +506,16 @@ class CryptoWebApp:
             timeframe = request.args.get('timeframe', 'hour')
             limit = int(request.args.get('limit', 100))
             
+            window = int(request.args.get('window', VOLATILITY_WINDOW))
+            
             # 获取原始数据
             raw_data = self.get_chart_data(timeframe, 'ETH', limit)
             
-            # 处理数据，生成三条曲线
-            processed_data = self.process_chart_data(raw_data, 'ETH')
-            
-            return jsonify({
+            # 处理数据，生成三条曲线（数据未变化时直接返回304，不再计算）
+            return conditional_response(request_etag(rows_watermark(raw_data)), lambda: jsonify({
                 'success': True,
-                'data': processed_data
-            })
+                'data': self.process_chart_data(raw_data, 'ETH', window)
+            }))
         except Exception as e:
             logging.error(f"API获取以太坊数据时出错: {str(e)}")
             return jsonify({
@@ -452,19 +572,52 @@ class CryptoWebApp:
     def api_kline_data(self):
         """API: 获取K线数据"""
         try:
-            from kline_backend import kline_backend
+            from kline_backend import kline_backend, parse_indicator_params, kline_since, kline_to_columns
             
             symbol = request.args.get('symbol', 'BTC')
             timeframe = request.args.get('timeframe', 'hour')
             limit = int(request.args.get('limit', 100))
             
-            # 使用新的后端处理模块获取数据
-            data = kline_backend.get_kline_data_with_indicators(symbol, timeframe, limit)
+            # indicators=ma,rsi 只计算指定指标，rsi_period=21 / ma_periods=5,60 等覆盖默认参数
+            # since=<毫秒时间戳> 只返回不早于该时间的K线和对应的指标值，format=columns 返回列式K线
+            # start=<毫秒时间戳> 为客户端窗口的起点，指标从该K线开始计算，返回的指标可直接拼接到已有数据后
+            try:
+                params = parse_indicator_params(request.args.get('indicators'), request.args)
+                since = parse_timestamp_ms(request.args.get('since'))
+                start = parse_timestamp_ms(request.args.get('start'), 'start')
+                response_format = parse_response_format(request.args.get('format'))
+            except ValueError as e:
+                return jsonify({
+                    'success': False,
+                    'error': str(e)
+                }), 400
             
-            return jsonify({
-                'success': True,
-                'data': data
-            })
+            # 使用新的后端处理模块获取数据；增量请求无法按客户端窗口计算时返回完整数据，
+            # window_start 与客户端的窗口起点不同时客户端整体替换
+            data = None
+            if since is not None and start is not None:
+                data = kline_backend.get_kline_data_since(symbol, timeframe, since, start, limit, params)
+            if data is None:
+                data = kline_backend.get_kline_data_with_indicators(symbol, timeframe, limit, params)
+                if data.get('kline'):
+                    data = dict(data, window_start=data['kline'][0][0])
+                if since is not None and start is None:
+                    data = kline_since(data, since)
+            
+            def build():
+                if response_format == 'columns':
+                    payload = dict(data)
+                    payload['kline'] = kline_to_columns(data.get('kline', []))
+                else:
+                    payload = data
+                return jsonify({
+                    'success': True,
+                    'data': payload
+                })
+            
+            # 指标由K线和参数（查询参数）决定，K线水位不变时内容不变
+            etag = request_etag(rows_watermark(data.get('kline', [])), data.get('error'))
+            return conditional_response(etag, build)
         except Exception as e:
             logging.error(f"API获取K线数据时出错: {str(e)}")
             return jsonify({
@@ -1,6 +1,8 @@
 import logging
 from crypto_scraper import scrape_all_crypto_data
 from crypto_db import CryptoDatabase
+from candle_store import CandleStore
+from cache_warmer import CacheWarmer
 from datetime import datetime
 import time
 
@@ -17,6 +19,21 @@ logging.basicConfig(
 class DataProcessor:
     def __init__(self):
         self.db = CryptoDatabase()
+        self.candle_store = CandleStore()
+        self.cache_warmer = CacheWarmer(self.db)
+    
+    def append_to_candle_store(self, timeframe, df):
+        """把新抓取的K线追加到Redis时间序列，返回涉及的币种"""
+        symbols = []
+        for symbol, group in df.groupby('symbol'):
+            symbols.append(symbol)
+            candles = list(zip(group['date'], group['open'], group['high'],
+                               group['low'], group['close'], group['volume']))
+            if self.candle_store.append(symbol, timeframe, candles):
+                logging.info(f"K线序列已更新: {symbol} {timeframe} +{len(candles)}")
+            else:
+                logging.warning(f"K线序列更新失败: {symbol} {timeframe}")
+        return symbols
     
     def process_and_store_data(self):
         """处理并存储抓取的数据"""
@@ -48,6 +65,7 @@ class DataProcessor:
                         logging.error(f"存储 {data['name']} 当前价格失败")
             
             # 存储历史数据
+            updated = set()
             for timeframe, df in historical_data.items():
                 if not df.empty:
                     logging.info(f"开始存储 {timeframe} 级历史数据，共 {len(df)} 条记录")
@@ -69,8 +87,25 @@ class DataProcessor:
                             logging.error(f"存储历史数据失败: {row['symbol']} - {row['date']}")
                     
                     logging.info(f"完成存储 {timeframe} 级历史数据")
+                    
+                    for symbol in self.append_to_candle_store(timeframe, df):
+                        updated.add((symbol, timeframe))
             
             logging.info("数据处理和存储完成")
+            
+            # 预热所有币种/时间周期的缓存，避免首个访问者回源数据库
+            warmed = {}
+            try:
+                warmed = self.cache_warmer.warm_all(connection=self.db.connection)
+            except Exception as e:
+                logging.error(f"缓存预热失败: {str(e)}")
+            
+            # 预热没有覆盖到的 (币种, 时间周期) 直接递增数据版本，使旧缓存失效
+            stale = [(symbol, timeframe) for symbol, timeframe in updated
+                     if not warmed.get(f"{symbol}:{timeframe}")]
+            if stale:
+                self.cache_warmer.cache_manager.bump_data_versions(stale)
+            
             return True
             
         except Exception as e:
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+HTTP条件请求
+数据接口根据数据水位（最新K线/最新报价）生成强ETag，
+请求的 If-None-Match 与之匹配时直接返回304，省去响应体的计算、序列化和传输
+"""
+
+import hashlib
+import json
+from typing import Callable, List, Sequence
+
+from flask import current_app, request
+
+# 压缩中间件为压缩后的响应ETag加上的后缀，同一数据的不同编码使用不同的强ETag
+ENCODING_ETAG_SUFFIX = {'gzip': '-gzip', 'br': '-br'}
+
+
+def make_etag(*parts) -> str:
+    """根据请求参数和数据水位生成ETag（不含引号）"""
+    encoded = json.dumps(parts, sort_keys=True, default=str, separators=(',', ':'))
+    return hashlib.sha1(encoded.encode('utf-8')).hexdigest()[:24]
+
+
+def request_etag(*watermark) -> str:
+    """当前请求（路径和查询参数）在给定数据水位下的ETag"""
+    return make_etag(request.path, request.args.to_dict(flat=False), *watermark)
+
+
+def rows_watermark(rows: Sequence) -> List:
+    """序列的数据水位: 行数和首尾两行
+
+    新K线会改变首尾之一（与排序方向无关），未收盘K线的更新会改变最新一行的价格和成交量。
+    """
+    if not rows:
+        return [0]
+    return [len(rows), rows[0], rows[-1]]
+
+
+def matching_etag(etag: str):
+    """返回 If-None-Match 中与etag（或其压缩编码版本）匹配的ETag，没有匹配时返回None"""
+    for candidate in [etag] + [etag + suffix for suffix in ENCODING_ETAG_SUFFIX.values()]:
+        if request.if_none_match.contains(candidate):
+            return candidate
+    return None
+
+
+def conditional_response(etag: str, build: Callable):
+    """If-None-Match 命中时返回304，否则调用build()生成响应并带上ETag
+
+    build 返回Flask响应或 (响应, 状态码)，只有200响应会带上ETag。
+    """
+    matched = matching_etag(etag)
+    if matched is not None:
+        response = current_app.response_class(status=304)
+        response.set_etag(matched)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+
+    result = build()
+    response, status = (result if isinstance(result, tuple) else (result, None))
+    if status is None or status == 200:
+        response.set_etag(etag)
+        # 允许浏览器缓存，但每次使用前都要重新验证
+        response.headers['Cache-Control'] = 'no-cache'
+    return result
+
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+技术指标计算
+基于NumPy的向量化实现，KlineProcessor 和 KlineBackend 共用
+
+所有函数沿最后一个轴计算，既可以传入单个序列，也可以传入 (币种数, K线数) 的二维数组批量计算。
+未定义的位置用 NaN 表示，调用方用 to_list() 转换为带 None 的列表。
+
+- 移动平均/标准差: 分块累加和，O(n)
+- 区间最高/最低价: van Herk/Gil-Werman 分块前缀/后缀极值，O(n)，与周期无关
+- EMA/Wilder平滑: 分块的递推核，每块内用幂次和累加和一次算完
+"""
+
+import numpy as np
+
+# 滚动累加和的分块大小，限制累加和的量级以保证精度
+ROLLING_BLOCK = 4096
+# EMA分块时衰减因子幂次的最大指数（e^300 远小于float64上限）
+EMA_MAX_EXPONENT = 300.0
+# 年化系数
+ANNUALIZATION = np.sqrt(252)
+
+
+def _as_array(values) -> np.ndarray:
+    return np.asarray(values, dtype=np.float64)
+
+
+def _nan_like(values: np.ndarray) -> np.ndarray:
+    return np.full(values.shape, np.nan)
+
+
+def _rolling_sum(values: np.ndarray, period: int) -> np.ndarray:
+    """滚动求和，分块计算累加和，每块以块首的值为基准减小舍入误差"""
+    n = values.shape[-1]
+    out = _nan_like(values)
+    if period < 1 or n < period:
+        return out
+
+    for start in range(period - 1, n, ROLLING_BLOCK):
+        end = min(start + ROLLING_BLOCK, n)
+        segment = values[..., start - period + 1:end]
+        base = segment[..., :1]
+        sums = np.cumsum(segment - base, axis=-1)
+        window = sums[..., period - 1:].copy()
+        window[..., 1:] -= sums[..., :-period]
+        out[..., start:end] = window + base * period
+    return out
+
+
+def sma(values, period: int) -> np.ndarray:
+    """简单移动平均"""
+    values = _as_array(values)
+    return _rolling_sum(values, period) / period
+
+
+def rolling_std(values, period: int, ddof: int = 0) -> np.ndarray:
+    """滚动标准差（ddof=0 与 np.std 一致，ddof=1 与 pandas rolling.std 一致）"""
+    values = _as_array(values)
+    if period - ddof <= 0:
+        return _nan_like(values)
+    mean = sma(values, period)
+    sum_sq = _rolling_sum(values * values, period)
+    variance = (sum_sq - period * mean * mean) / (period - ddof)
+    # 数值误差可能产生极小的负数或噪声，按窗口内价格量级截断
+    scale = _rolling_sum(np.abs(values), period) / period
+    variance[variance < (scale * scale) * 1e-12] = 0.0
+    return np.sqrt(variance)
+
+
+def _rolling_extreme(values, period: int, ufunc) -> np.ndarray:
+    values = _as_array(values)
+    n = values.shape[-1]
+    out = _nan_like(values)
+    if period < 1 or n < period:
+        return out
+
+    pad = (-n) % period
+    if pad:
+        edge = np.repeat(values[..., -1:], pad, axis=-1)
+        values = np.concatenate([values, edge], axis=-1)
+    blocks = values.reshape(values.shape[:-1] + (-1, period))
+    prefix = ufunc.accumulate(blocks, axis=-1).reshape(values.shape)
+    suffix = np.flip(ufunc.accumulate(np.flip(blocks, axis=-1), axis=-1), axis=-1).reshape(values.shape)
+
+    # 窗口 [i-period+1, i] 最多跨两个块: 前一块的后缀极值与后一块的前缀极值
+    out[..., period - 1:] = ufunc(suffix[..., :n - period + 1], prefix[..., period - 1:n])
+    return out
+
+
+def rolling_max(values, period: int) -> np.ndarray:
+    """滚动最高值"""
+    return _rolling_extreme(values, period, np.maximum)
+
+
+def rolling_min(values, period: int) -> np.ndarray:
+    """滚动最低值"""
+    return _rolling_extreme(values, period, np.minimum)
+
+
+def ema_kernel(values, alpha: float, initial) -> np.ndarray:
+    """递推 y[t] = (1 - alpha) * y[t-1] + alpha * x[t]，y[-1] = initial
+
+    分块展开为 y[t] = d^(t+1) * y[-1] + alpha * Σ d^(t-k) * x[k]（d = 1 - alpha），
+    块长度保证 d^-k 不会溢出。
+    """
+    values = _as_array(values)
+    n = values.shape[-1]
+    out = np.empty_like(values)
+    previous = np.broadcast_to(_as_array(initial), values.shape[:-1]).astype(np.float64)
+    if n == 0:
+        return out
+    if alpha >= 1:
+        out[...] = values
+        return out
+
+    decay = 1.0 - alpha
+    chunk = max(1, int(EMA_MAX_EXPONENT / -np.log(decay)))
+    for start in range(0, n, chunk):
+        segment = values[..., start:start + chunk]
+        steps = np.arange(segment.shape[-1])
+        growth = decay ** -steps
+        shrink = decay ** steps
+        weighted = np.cumsum(segment * growth, axis=-1)
+        result = (previous[..., None] * (shrink * decay)) + alpha * weighted * shrink
+        out[..., start:start + segment.shape[-1]] = result
+        previous = result[..., -1]
+    return out
+
+
+def ema(values, period: int, seed: str = 'sma') -> np.ndarray:
+    """指数移动平均
+
+    seed='sma': 以前period个值的平均作为初值（前period-1个位置为NaN）
+    seed='first': 以第一个值作为初值（与 pandas ewm(adjust=False) 一致）
+    """
+    values = _as_array(values)
+    n = values.shape[-1]
+    alpha = 2.0 / (period + 1)
+    out = _nan_like(values)
+
+    if seed == 'first':
+        if n:
+            out[..., 0] = values[..., 0]
+            out[..., 1:] = ema_kernel(values[..., 1:], alpha, values[..., 0])
+        return out
+
+    if n < period:
+        return out
+    initial = values[..., :period].mean(axis=-1)
+    out[..., period - 1] = initial
+    out[..., period:] = ema_kernel(values[..., period:], alpha, initial)
+    return out
+
+
+def rsi(values, period: int = 14) -> np.ndarray:
+    """Wilder RSI，前period个位置为NaN，平均跌幅为0时为100"""
+    values = _as_array(values)
+    out = _nan_like(values)
+    if values.shape[-1] < period + 1:
+        return out
+
+    deltas = np.diff(values, axis=-1)
+    gains = np.where(deltas > 0, deltas, 0.0)
+    losses = np.where(deltas < 0, -deltas, 0.0)
+
+    avg_gain = np.empty(values.shape[:-1] + (values.shape[-1] - period,))
+    avg_loss = np.empty_like(avg_gain)
+    avg_gain[..., 0] = gains[..., :period].mean(axis=-1)
+    avg_loss[..., 0] = losses[..., :period].mean(axis=-1)
+    avg_gain[..., 1:] = ema_kernel(gains[..., period:], 1.0 / period, avg_gain[..., 0])
+    avg_loss[..., 1:] = ema_kernel(losses[..., period:], 1.0 / period, avg_loss[..., 0])
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        result = 100 - 100 / (1 + avg_gain / avg_loss)
+    out[..., period:] = np.where(avg_loss == 0, 100.0, result)
+    return out
+
+
+def macd(values, fast: int = 12, slow: int = 26, signal: int = 9, seed: str = 'sma') -> tuple:
+    """MACD，返回 (MACD线, 信号线, 柱状图)
+
+    seed='sma' 时信号线只对MACD线的有效部分计算，与 KlineProcessor 一致；
+    seed='first' 时与 pandas ewm(adjust=False) 一致。
+    """
+    values = _as_array(values)
+    line = ema(values, fast, seed) - ema(values, slow, seed)
+    if seed == 'first':
+        signal_line = ema(line, signal, seed)
+    else:
+        signal_line = _nan_like(values)
+        signal_line[..., slow - 1:] = ema(line[..., slow - 1:], signal, seed)
+    return line, signal_line, line - signal_line
+
+
+def bollinger_bands(values, period: int = 20, num_std: float = 2, ddof: int = 0) -> tuple:
+    """布林带，返回 (上轨, 中轨, 下轨)"""
+    middle = sma(values, period)
+    std = rolling_std(values, period, ddof)
+    return middle + std * num_std, middle, middle - std * num_std
+
+
+def volatility(values, window: int = 20, ddof: int = 0, scale: float = ANNUALIZATION) -> np.ndarray:
+    """收益率的滚动标准差乘以年化系数
+
+    window为收益率个数，结果在第 window 根K线（第一个收益率位于第1根）开始有值。
+    """
+    values = _as_array(values)
+    out = _nan_like(values)
+    returns = np.diff(values, axis=-1) / values[..., :-1]
+    out[..., 1:] = rolling_std(returns, window, ddof) * scale
+    return out
+
+
+def kdj(highs, lows, closes, period: int = 9, k_smooth: int = 3, d_smooth: int = 3,
+        initial=None) -> tuple:
+    """KDJ指标，返回 (K, D, J)
+
+    initial为K/D在第period根K线处的初值，None表示K取当根RSV、D取当根K。
+    """
+    closes = _as_array(closes)
+    highest = rolling_max(highs, period)
+    lowest = rolling_min(lows, period)
+    spread = highest - lowest
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rsv = np.where(spread == 0, 50.0, (closes - lowest) / spread * 100)
+
+    k = _nan_like(closes)
+    d = _nan_like(closes)
+    if closes.shape[-1] < period:
+        return k, d, 3 * k - 2 * d
+
+    first = period - 1
+    k[..., first] = rsv[..., first] if initial is None else initial
+    k[..., period:] = ema_kernel(rsv[..., period:], 1.0 / k_smooth, k[..., first])
+    d[..., first] = k[..., first] if initial is None else initial
+    d[..., period:] = ema_kernel(k[..., period:], 1.0 / d_smooth, d[..., first])
+    return k, d, 3 * k - 2 * d
+
+
+def to_list(values, digits=None) -> list:
+    """把指标数组转换为列表，NaN转换为None，可选保留小数位"""
+    values = _as_array(values)
+    if digits is not None:
+        values = np.round(values, digits)
+    result = values.tolist()
+    if values.ndim == 1:
+        return [None if value != value else value for value in result]
+    return [[None if value != value else value for value in row] for row in result]
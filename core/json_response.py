@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+API响应的JSON序列化
+替换Flask默认的JSON provider，jsonify() 自动使用:
+- 安装了orjson时使用orjson（C实现，直接输出bytes，原生支持NumPy数组和datetime）
+- 否则使用标准库json，输出紧凑分隔符
+
+两种实现的输出保持一致: NumPy数组/标量直接序列化，NaN/Infinity（包括Python浮点数）输出为null，
+datetime/date输出为ISO 8601字符串，Decimal输出为数字，字典保持插入顺序。
+"""
+
+import json
+import math
+from datetime import date, datetime
+from decimal import Decimal
+
+import numpy as np
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+ORJSON_OPTIONS = (orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS) if orjson is not None else 0
+
+
+def _array_to_list(values: np.ndarray) -> list:
+    """标准库路径下的NumPy数组转换，浮点数组中的NaN/Infinity转换为None"""
+    result = values.tolist()
+    if values.dtype.kind != 'f':
+        return result
+
+    def clean(item):
+        if isinstance(item, list):
+            return [clean(value) for value in item]
+        return item if math.isfinite(item) else None
+
+    return clean(result)
+
+
+def _default(value):
+    """序列化JSON不支持的类型"""
+    if isinstance(value, np.ndarray):
+        # orjson只直接支持C连续数组，其他数组（如切片视图）在这里转换
+        if orjson is not None and value.dtype.kind in 'biuf' and not value.flags.c_contiguous:
+            return np.ascontiguousarray(value)
+        return _array_to_list(value)
+    if isinstance(value, np.generic):
+        item = value.item()
+        return None if isinstance(item, float) and not math.isfinite(item) else item
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return _finite(float(value))
+    if isinstance(value, (set, frozenset, tuple)):
+        return _finite(list(value))
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _finite(value):
+    """标准库路径下把NaN/Infinity浮点数（包括np.float64）替换为None
+
+    float的子类不会经过default，json.dumps会直接输出非法的NaN，需要预先替换。
+    """
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, dict):
+        return {key: _finite(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_finite(item) for item in value]
+    return value
+
+
+def dumps_bytes(value) -> bytes:
+    """把响应数据序列化为UTF-8字节"""
+    if orjson is not None:
+        return orjson.dumps(value, default=_default, option=ORJSON_OPTIONS)
+    try:
+        encoded = json.dumps(value, default=_default, ensure_ascii=False, allow_nan=False,
+                             separators=(',', ':'))
+    except ValueError:
+        # 只有包含NaN/Infinity时才复制并替换整个结构
+        encoded = json.dumps(_finite(value), default=_default, ensure_ascii=False, allow_nan=False,
+                             separators=(',', ':'))
+    return encoded.encode('utf-8')
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider，使用 dumps_bytes 序列化并直接以字节构造响应"""
+
+    def dumps(self, obj, **kwargs) -> str:
+        return dumps_bytes(obj).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if orjson is not None:
+            return orjson.loads(s)
+        return json.loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps_bytes(obj), mimetype=self.mimetype)
+
+
+def init_json(app):
+    """为Flask应用启用快速JSON序列化"""
+    app.json = FastJSONProvider(app)
+    return app
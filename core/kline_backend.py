@@ -3,10 +3,139 @@ import pandas as pd
 import numpy as np
 import json
 import os
-import glob
+import bisect
 import logging
 from datetime import datetime, timedelta
 from crypto_db import CryptoDatabase
+from simple_redis_manager import get_cache_manager
+from candle_store import CandleStore, to_epoch_seconds
+from cache_codec import EPOCH
+from kline_store import get_kline_store, to_timestamp_ms
+from kline_index import get_kline_file_index
+import indicators
+
+# build_kline_payload 使用的指标参数
+DEFAULT_INDICATOR_PARAMS = {
+    'ma': {'periods': [5, 10, 20]},
+    'rsi': {'period': 14},
+    'macd': {'short_period': 12, 'long_period': 26, 'signal_period': 9},
+    'bollinger': {'period': 20, 'std_dev': 2.0},
+    'volatility': {'period': 20},
+    'kdj': {'period': 9, 'k_period': 3, 'd_period': 3}
+}
+# 指标计算结果的缓存时间，新K线入库后缓存键随数据水位变化
+INDICATOR_RESULT_EXPIRE = 600
+# 列式返回格式的列名，对应K线数组 [timestamp, open, high, low, close, volume]
+KLINE_COLUMNS = ('t', 'o', 'h', 'l', 'c', 'v')
+# 增量请求的窗口（从客户端窗口起点到最新K线）超过 limit 的倍数时改为返回完整数据，重新对齐窗口
+INCREMENTAL_WINDOW_FACTOR = 2
+
+def parse_indicator_params(names=None, overrides=None):
+    """根据请求参数生成要计算的指标及其参数
+    
+    names: 逗号分隔的指标名（ma,rsi,macd,bollinger,volatility,kdj），None表示全部，空字符串表示只返回K线
+    overrides: 形如 {'rsi_period': '21', 'ma_periods': '5,60'} 的参数覆盖，未知的键会被忽略
+    参数不合法时抛出 ValueError
+    """
+    if names is None:
+        selected = list(DEFAULT_INDICATOR_PARAMS)
+    else:
+        selected = [name.strip().lower() for name in names.split(',') if name.strip()]
+        unknown = [name for name in selected if name not in DEFAULT_INDICATOR_PARAMS]
+        if unknown:
+            raise ValueError(f"未知的指标: {', '.join(unknown)}")
+    
+    overrides = overrides or {}
+    params = {}
+    for name in selected:
+        group = dict(DEFAULT_INDICATOR_PARAMS[name])
+        for param, default in group.items():
+            raw = overrides.get(f"{name}_{param}")
+            if raw is None:
+                continue
+            try:
+                if isinstance(default, list):
+                    value = [int(item) for item in str(raw).split(',') if item.strip()]
+                    valid = bool(value) and all(item > 0 for item in value)
+                elif isinstance(default, int):
+                    value = int(raw)
+                    valid = value > 0
+                else:
+                    value = float(raw)
+                    valid = value > 0
+            except (TypeError, ValueError):
+                valid = False
+            if not valid:
+                raise ValueError(f"指标参数不合法: {name}_{param}={raw}")
+            group[param] = value
+        params[name] = group
+    return params
+
+def select_indicators(payload, params):
+    """从包含全部默认指标的结果中挑出请求的指标"""
+    source = payload.get('indicators', {})
+    selected = {}
+    for name, group in params.items():
+        if name == 'ma':
+            for period in group['periods']:
+                selected[f'ma{period}'] = source[f'ma{period}']
+        elif name == 'macd':
+            for key in ('macd_line', 'signal_line', 'macd_hist'):
+                selected[key] = source[key]
+        else:
+            selected[name] = source[name]
+    return {'kline': payload['kline'], 'indicators': selected}
+
+def kline_since(payload, since):
+    """截取时间戳不早于since（毫秒）的K线及对应位置的指标值
+    
+    客户端传入已有的最后一根K线时间戳，该K线可能尚未收盘，会和之后的新K线一起返回。
+    """
+    kline = payload.get('kline', [])
+    start = bisect.bisect_left([row[0] for row in kline], since)
+    
+    def tail(value):
+        if isinstance(value, dict):
+            return {key: tail(item) for key, item in value.items()}
+        return list(value)[start:]
+    
+    result = dict(payload)
+    result['kline'] = kline[start:]
+    result['indicators'] = tail(payload.get('indicators', {}))
+    return result
+
+def kline_to_columns(kline):
+    """把K线数组转换为列式数据 {t: [...], o: [...], h: [...], l: [...], c: [...], v: [...]}"""
+    return {name: [row[index] for row in kline] for index, name in enumerate(KLINE_COLUMNS)}
+
+def rows_to_kline(data):
+    """把数据库查询结果转换为按时间升序的K线数组 [timestamp, open, high, low, close, volume]"""
+    kline_data = []
+    for item in data:
+        symbol_db, date, open_price, high_price, low_price, close_price, volume = item
+        # 转换日期为时间戳（毫秒）
+        if hasattr(date, 'timestamp'):
+            timestamp = int(date.timestamp() * 1000)
+        else:
+            # 如果是字符串，尝试解析
+            try:
+                dt = pd.to_datetime(date)
+                timestamp = int(dt.timestamp() * 1000)
+            except:
+                timestamp = int(datetime.now().timestamp() * 1000)
+        
+        kline_data.append([
+            timestamp,
+            float(open_price),
+            float(high_price),
+            float(low_price),
+            float(close_price),
+            float(volume)
+        ])
+    
+    # 按时间排序
+    kline_data.sort(key=lambda x: x[0])
+    return kline_data
 
 class KlineBackend:
     """K线数据后端处理类 - 只从数据库获取真实数据"""
@@ -14,9 +143,27 @@ class KlineBackend:
     def __init__(self):
         self.logger = logging.getLogger(__name__)
         self.db = CryptoDatabase()
+        
+        # 初始化Redis缓存管理器
+        try:
+            self.cache_manager = get_cache_manager()
+        except Exception as e:
+            self.logger.warning(f"Redis缓存管理器初始化失败: {e}")
+            self.cache_manager = None
     
     def get_database_kline_data(self, symbol, timeframe, limit=100):
-        """从数据库获取K线数据"""
+        """从数据库获取K线数据（优先读取Redis中的K线缓存）"""
+        version = None
+        if self.cache_manager:
+            try:
+                version = self.cache_manager.get_data_version(symbol, timeframe)
+                cached_kline = self.cache_manager.get_kline_data(symbol, timeframe, version=version)
+                if cached_kline and len(cached_kline) >= limit:
+                    self.logger.info(f"从Redis缓存获取 {symbol} 的 {timeframe} 级K线数据")
+                    return cached_kline[-limit:]
+            except Exception as e:
+                self.logger.warning(f"从Redis缓存获取K线数据失败: {e}")
+        
         if not self.db.connect():
             self.logger.error("数据库连接失败")
             return []
@@ -29,33 +176,16 @@ class KlineBackend:
                 return []
             
             # 转换为K线格式 [timestamp, open, high, low, close, volume]
-            kline_data = []
-            for item in data:
-                symbol_db, date, open_price, high_price, low_price, close_price, volume = item
-                # 转换日期为时间戳（毫秒）
-                if hasattr(date, 'timestamp'):
-                    timestamp = int(date.timestamp() * 1000)
-                else:
-                    # 如果是字符串，尝试解析
-                    try:
-                        dt = pd.to_datetime(date)
-                        timestamp = int(dt.timestamp() * 1000)
-                    except:
-                        timestamp = int(datetime.now().timestamp() * 1000)
-                
-                kline_data.append([
-                    timestamp,
-                    float(open_price),
-                    float(high_price),
-                    float(low_price),
-                    float(close_price),
-                    float(volume)
-                ])
-            
-            # 按时间排序
-            kline_data.sort(key=lambda x: x[0])
+            kline_data = rows_to_kline(data)
             
             self.logger.info(f"成功从数据库获取 {symbol} 的 {timeframe} 级K线数据，共 {len(kline_data)} 条")
+            
+            if self.cache_manager and kline_data:
+                try:
+                    self.cache_manager.cache_kline_data(symbol, timeframe, kline_data, version=version)
+                except Exception as e:
+                    self.logger.warning(f"缓存K线数据到Redis失败: {e}")
+            
             return kline_data
             
         except Exception as e:
@@ -64,239 +194,237 @@ class KlineBackend:
         finally:
             self.db.disconnect()
     
+    @staticmethod
+    def _closes(data):
+        return np.array([d[4] for d in data], dtype=np.float64)
+    
     def calculate_ma(self, data, period):
         """计算移动平均线"""
-        close_prices = [d[4] for d in data]
-        ma_values = []
-        
-        for i in range(len(close_prices)):
-            if i < period - 1:
-                ma_values.append(None)
-            else:
-                ma = sum(close_prices[i-period+1:i+1]) / period
-                ma_values.append(round(ma, 2))
-        
-        return ma_values
+        return indicators.to_list(indicators.sma(self._closes(data), period), 2)
     
     def calculate_rsi(self, data, period=14):
         """计算RSI相对强弱指数"""
-        close_prices = np.array([d[4] for d in data])
-        deltas = np.diff(close_prices)
-        
-        gains = np.where(deltas > 0, deltas, 0)
-        losses = np.where(deltas < 0, -deltas, 0)
-        
-        rsi_values = [None] * period  # 前period个值为None
-        
-        # 计算初始平均收益和损失
-        avg_gain = np.mean(gains[:period])
-        avg_loss = np.mean(losses[:period])
-        
-        if avg_loss == 0:
-            rsi_values.append(100)
-        else:
-            rs = avg_gain / avg_loss
-            rsi = 100 - (100 / (1 + rs))
-            rsi_values.append(round(rsi, 2))
-        
-        # 计算后续RSI值
-        for i in range(period + 1, len(close_prices)):
-            avg_gain = (avg_gain * (period - 1) + gains[i-1]) / period
-            avg_loss = (avg_loss * (period - 1) + losses[i-1]) / period
-            
-            if avg_loss == 0:
-                rsi_values.append(100)
-            else:
-                rs = avg_gain / avg_loss
-                rsi = 100 - (100 / (1 + rs))
-                rsi_values.append(round(rsi, 2))
-        
-        return rsi_values
+        return indicators.to_list(indicators.rsi(self._closes(data), period), 2)
     
     def calculate_macd(self, data, short_period=12, long_period=26, signal_period=9):
         """计算MACD指标"""
-        close_prices = pd.Series([d[4] for d in data])
-        
-        # 计算EMA
-        ema_short = close_prices.ewm(span=short_period, adjust=False).mean()
-        ema_long = close_prices.ewm(span=long_period, adjust=False).mean()
-        
-        # MACD线
-        macd_line = ema_short - ema_long
-        
-        # 信号线
-        signal_line = macd_line.ewm(span=signal_period, adjust=False).mean()
-        
-        # MACD柱状图
-        macd_hist = macd_line - signal_line
+        # 与 pandas ewm(span, adjust=False) 一致，以第一个收盘价作为EMA初值
+        macd_line, signal_line, macd_hist = indicators.macd(
+            self._closes(data), short_period, long_period, signal_period, seed='first')
         
         return (
-            [round(x, 4) for x in macd_line.tolist()],
-            [round(x, 4) for x in signal_line.tolist()],
-            [round(x, 4) for x in macd_hist.tolist()]
+            indicators.to_list(macd_line, 4),
+            indicators.to_list(signal_line, 4),
+            indicators.to_list(macd_hist, 4)
         )
     
     def calculate_bollinger_bands(self, data, period=20, std_dev=2):
         """计算布林带"""
-        close_prices = pd.Series([d[4] for d in data])
-        
-        # 中轨（移动平均线）
-        middle = close_prices.rolling(window=period).mean()
-        
-        # 标准差
-        std = close_prices.rolling(window=period).std()
-        
-        # 上轨和下轨
-        upper = middle + (std * std_dev)
-        lower = middle - (std * std_dev)
+        # 样本标准差，与 pandas rolling.std 一致
+        upper, middle, lower = indicators.bollinger_bands(self._closes(data), period, std_dev, ddof=1)
         
         return {
-            'upper': [round(x, 2) if not pd.isna(x) else None for x in upper.tolist()],
-            'middle': [round(x, 2) if not pd.isna(x) else None for x in middle.tolist()],
-            'lower': [round(x, 2) if not pd.isna(x) else None for x in lower.tolist()]
+            'upper': indicators.to_list(upper, 2),
+            'middle': indicators.to_list(middle, 2),
+            'lower': indicators.to_list(lower, 2)
         }
     
     def calculate_kdj(self, data, period=9, k_period=3, d_period=3):
         """计算KDJ指标"""
         high_prices = [d[2] for d in data]
         low_prices = [d[3] for d in data]
-        close_prices = [d[4] for d in data]
-        
-        k_values = []
-        d_values = []
-        j_values = []
         
-        for i in range(len(data)):
-            if i < period - 1:
-                k_values.append(None)
-                d_values.append(None)
-                j_values.append(None)
-            else:
-                # 计算RSV
-                period_high = max(high_prices[i-period+1:i+1])
-                period_low = min(low_prices[i-period+1:i+1])
-                
-                if period_high == period_low:
-                    rsv = 50
-                else:
-                    rsv = (close_prices[i] - period_low) / (period_high - period_low) * 100
-                
-                # 计算K值
-                if i == period - 1:
-                    k = rsv
-                else:
-                    k = (k_values[i-1] * (k_period - 1) + rsv) / k_period if k_values[i-1] is not None else rsv
-                
-                k_values.append(round(k, 2))
-                
-                # 计算D值
-                if i == period - 1:
-                    d = k
-                else:
-                    d = (d_values[i-1] * (d_period - 1) + k) / d_period if d_values[i-1] is not None else k
-                
-                d_values.append(round(d, 2))
-                
-                # 计算J值
-                j = 3 * k - 2 * d
-                j_values.append(round(j, 2))
+        # 第一个有效K值取当根RSV，D值取当根K值
+        k_values, d_values, j_values = indicators.kdj(high_prices, low_prices, self._closes(data),
+                                                      period, k_period, d_period)
         
-        return {'k': k_values, 'd': d_values, 'j': j_values}
+        return {
+            'k': indicators.to_list(k_values, 2),
+            'd': indicators.to_list(d_values, 2),
+            'j': indicators.to_list(j_values, 2)
+        }
     
     def calculate_volatility(self, data, period=20):
         """计算波动率"""
-        close_prices = pd.Series([d[4] for d in data])
-        returns = close_prices.pct_change()
-        volatility = returns.rolling(window=period).std() * np.sqrt(252) * 100  # 年化波动率
+        # 收益率的样本标准差，年化后以百分比表示
+        volatility = indicators.volatility(self._closes(data), period, ddof=1,
+                                           scale=indicators.ANNUALIZATION * 100)
         
-        return [round(x, 2) if not pd.isna(x) else None for x in volatility.tolist()]
+        return indicators.to_list(volatility, 2)
     
-    def get_kline_data_with_indicators(self, symbol='BTC', timeframe='hour', limit=100):
-        """获取K线数据和技术指标 - 只从数据库获取真实数据"""
+    def load_file_kline_data(self, symbol, timeframe, limit=None):
+        """从处理过的K线数据读取（数据库无数据时的后备数据源）
+        
+        优先读取列式存储中最近limit根K线，没有时读取最新的JSON文件。
+        """
+        try:
+            kline_data = get_kline_store().read_kline(symbol, timeframe, limit)
+            if kline_data:
+                return kline_data
+        except Exception as e:
+            self.logger.warning(f"读取K线列式存储失败: {e}")
+        
+        # 通过索引直接定位最新的文件
+        latest_file = get_kline_file_index().latest_file(symbol, timeframe)
+        if not latest_file:
+            return []
+        
+        with open(latest_file, 'r', encoding='utf-8') as f:
+            file_data = json.load(f)
+        
+        # 转换为标准格式
+        kline_data = []
+        for item in file_data.get('kline_data', []):
+            if isinstance(item, dict):
+                # 如果是字典格式，转换为数组格式
+                timestamp = to_timestamp_ms(item['date'])
+                kline_data.append([
+                    timestamp,
+                    item['open'],
+                    item['high'],
+                    item['low'],
+                    item['close'],
+                    item.get('volume', 0)
+                ])
+            else:
+                # 如果已经是数组格式，直接使用
+                kline_data.append(item)
+        return kline_data
+    
+    def build_kline_payload(self, kline_data, limit=100, params=None):
+        """根据K线数组计算技术指标，生成API返回的数据结构
+        
+        params为 parse_indicator_params() 的结果，只计算其中列出的指标，None表示全部默认指标。
+        """
+        # 限制数据量
+        if len(kline_data) > limit:
+            kline_data = kline_data[-limit:]
+        
+        # 计算技术指标
+        if params is None:
+            params = DEFAULT_INDICATOR_PARAMS
+        results = {}
+        if 'ma' in params:
+            for period in params['ma']['periods']:
+                results[f'ma{period}'] = self.calculate_ma(kline_data, period)
+        if 'rsi' in params:
+            results['rsi'] = self.calculate_rsi(kline_data, **params['rsi'])
+        if 'macd' in params:
+            macd_line, signal_line, macd_hist = self.calculate_macd(kline_data, **params['macd'])
+            results['macd_line'] = macd_line
+            results['signal_line'] = signal_line
+            results['macd_hist'] = macd_hist
+        if 'bollinger' in params:
+            results['bollinger'] = self.calculate_bollinger_bands(kline_data, **params['bollinger'])
+        if 'volatility' in params:
+            results['volatility'] = self.calculate_volatility(kline_data, **params['volatility'])
+        if 'kdj' in params:
+            results['kdj'] = self.calculate_kdj(kline_data, **params['kdj'])
+        
+        return {
+            'kline': kline_data,
+            'indicators': results
+        }
+    
+    def get_or_build_kline_payload(self, symbol, timeframe, kline_data, limit=100, params=None):
+        """按 (币种, 时间周期, 最后一根K线, 指标参数) 缓存指标计算结果
+        
+        同一根K线上并发的请求只计算一次，新K线入库后缓存键自动变化。
+        """
+        if params is None:
+            params = DEFAULT_INDICATOR_PARAMS
+        window = kline_data[-limit:]
+        if not self.cache_manager:
+            return self.build_kline_payload(window, limit, params)
+        
+        key_params = {
+            'limit': limit,
+            'count': len(window),
+            'last': window[-1],
+            'indicators': params
+        }
+        key = self.cache_manager.indicator_result_key(symbol, timeframe, window[-1][0], key_params)
+        return self.cache_manager.get_or_compute(
+            key, lambda: self.build_kline_payload(window, limit, params), INDICATOR_RESULT_EXPIRE)
+    
+    def get_kline_data_since(self, symbol, timeframe, since, start, limit=100, params=None):
+        """增量请求: 指标从客户端窗口的起点start（毫秒）开始计算，只返回since（毫秒）之后的部分
+        
+        返回的指标与客户端已有的指标属于同一窗口，可以直接拼接。K线从Redis时间序列读取，
+        时间序列中没有start对应的K线或窗口超过 limit*INCREMENTAL_WINDOW_FACTOR 时返回None，
+        由调用方返回完整数据。
+        """
+        if not self.cache_manager:
+            return None
+        
+        try:
+            start_seconds = to_epoch_seconds(datetime.fromtimestamp(start / 1000))
+            candles = CandleStore(self.cache_manager.redis).get_range(symbol, timeframe, start_seconds)
+        except Exception as e:
+            self.logger.warning(f"从Redis时间序列获取增量K线失败: {e}")
+            return None
+        
+        kline_data = [[to_timestamp_ms(EPOCH + timedelta(seconds=ts)), o, h, l, c, v]
+                      for ts, o, h, l, c, v in candles]
+        if not kline_data or kline_data[0][0] != start or len(kline_data) > limit * INCREMENTAL_WINDOW_FACTOR:
+            return None
+        
+        payload = self.get_or_build_kline_payload(symbol, timeframe, kline_data, len(kline_data), params)
+        result = kline_since(payload, since)
+        result['window_start'] = start
+        return result
+    
+    def get_kline_data_with_indicators(self, symbol='BTC', timeframe='hour', limit=100, params=None):
+        """获取K线数据和技术指标 - 只从数据库获取真实数据
+        
+        params为 parse_indicator_params() 的结果，None表示全部默认指标。
+        请求的指标都使用默认参数时，优先从缓存（入库流程完成后会预热）中已计算好的结果里挑选，
+        否则只计算请求的指标。
+        """
+        if params is None:
+            params = DEFAULT_INDICATOR_PARAMS
+        full_default = params == DEFAULT_INDICATOR_PARAMS
+        defaults_only = all(group == DEFAULT_INDICATOR_PARAMS[name] for name, group in params.items())
+        
+        version = None
+        if self.cache_manager:
+            try:
+                version = self.cache_manager.get_data_version(symbol, timeframe)
+                cached_payload = None
+                if defaults_only:
+                    cached_payload = self.cache_manager.get_kline_payload(symbol, timeframe, limit, version=version)
+                if cached_payload:
+                    self.logger.info(f"从Redis缓存获取 {symbol} 的 {timeframe} 级K线和指标数据")
+                    return cached_payload if full_default else select_indicators(cached_payload, params)
+            except Exception as e:
+                self.logger.warning(f"从Redis缓存获取K线指标数据失败: {e}")
+        
         try:
             # 首先尝试从数据库直接获取数据
             kline_data = self.get_database_kline_data(symbol, timeframe, limit)
             
             # 如果数据库没有数据，尝试从处理过的文件读取
             if not kline_data:
-                # 获取项目根目录路径
-                current_dir = os.path.dirname(os.path.abspath(__file__))
-                project_root = os.path.dirname(current_dir)
-                data_dir = os.path.join(project_root, 'data', 'kline_data')
-                
-                pattern = os.path.join(data_dir, f"{symbol.upper()}_{timeframe}_kline_*.json")
-                matching_files = glob.glob(pattern)
-                
-                if matching_files:
-                    # 使用最新的文件
-                    latest_file = sorted(matching_files)[-1]
-                    with open(latest_file, 'r', encoding='utf-8') as f:
-                        file_data = json.load(f)
-                    
-                    # 转换为标准格式
-                    kline_data = []
-                    for item in file_data.get('kline_data', []):
-                        if isinstance(item, dict):
-                            # 如果是字典格式，转换为数组格式
-                            timestamp = int(pd.to_datetime(item['date']).timestamp() * 1000)
-                            kline_data.append([
-                                timestamp,
-                                item['open'],
-                                item['high'],
-                                item['low'],
-                                item['close'],
-                                item.get('volume', 0)
-                            ])
-                        else:
-                            # 如果已经是数组格式，直接使用
-                            kline_data.append(item)
-                else:
-                    # 如果没有任何数据源，返回空结果
-                    self.logger.error(f"无法获取{symbol}的{timeframe}数据：数据库和文件中都没有数据")
-                    return {
-                        'kline': [],
-                        'indicators': {},
-                        'error': f'没有找到{symbol}的{timeframe}级数据'
-                    }
+                kline_data = self.load_file_kline_data(symbol, timeframe, limit)
             
             # 如果没有数据，返回空结果
             if not kline_data:
-                self.logger.error(f"无法获取{symbol}的{timeframe}数据")
+                self.logger.error(f"无法获取{symbol}的{timeframe}数据：数据库和文件中都没有数据")
                 return {
                     'kline': [],
                     'indicators': {},
                     'error': f'没有找到{symbol}的{timeframe}级数据'
                 }
             
-            # 限制数据量
-            if len(kline_data) > limit:
-                kline_data = kline_data[-limit:]
+            payload = self.get_or_build_kline_payload(symbol, timeframe, kline_data, limit, params)
             
-            # 计算技术指标
-            ma5 = self.calculate_ma(kline_data, 5)
-            ma10 = self.calculate_ma(kline_data, 10)
-            ma20 = self.calculate_ma(kline_data, 20)
-            rsi = self.calculate_rsi(kline_data)
-            macd_line, signal_line, macd_hist = self.calculate_macd(kline_data)
-            bollinger = self.calculate_bollinger_bands(kline_data)
-            volatility = self.calculate_volatility(kline_data)
-            kdj = self.calculate_kdj(kline_data)
+            if self.cache_manager and full_default:
+                try:
+                    self.cache_manager.cache_kline_payload(symbol, timeframe, limit, payload, version=version)
+                except Exception as e:
+                    self.logger.warning(f"缓存K线指标数据到Redis失败: {e}")
             
-            return {
-                'kline': kline_data,
-                'indicators': {
-                    'ma5': ma5,
-                    'ma10': ma10,
-                    'ma20': ma20,
-                    'rsi': rsi,
-                    'macd_line': macd_line,
-                    'signal_line': signal_line,
-                    'macd_hist': macd_hist,
-                    'bollinger': bollinger,
-                    'volatility': volatility,
-                    'kdj': kdj
-                }
-            }
+            return payload
             
         except Exception as e:
             self.logger.error(f"获取K线数据时出错: {str(e)}")
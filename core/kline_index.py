@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+K线JSON文件索引和保留策略
+每个 (币种, 时间周期) 在 data/kline_data/index/{SYMBOL}_{timeframe}.json 中记录最新的文件名，
+读取最新文件时不再需要 glob + 排序整个目录；压缩任务按保留策略删除旧文件并重建索引
+"""
+
+import glob
+import json
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+FILE_TIMESTAMP_FORMAT = '%Y%m%d_%H%M%S'
+# 默认保留策略: 每个序列最多保留的文件数 / 天数，超出任一限制的文件都会被删除
+DEFAULT_KEEP_LAST = int(os.getenv('KLINE_RETENTION_FILES', '10'))
+DEFAULT_KEEP_DAYS = int(os.getenv('KLINE_RETENTION_DAYS', '7'))
+
+
+def default_data_dir() -> str:
+    """项目根目录下的 data/kline_data"""
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    project_root = os.path.dirname(current_dir)
+    return os.path.join(project_root, 'data', 'kline_data')
+
+
+def kline_filename(symbol: str, timeframe: str, timestamp: str) -> str:
+    return f"{symbol}_{timeframe}_kline_{timestamp}.json"
+
+
+def parse_kline_filename(filename: str) -> Optional[tuple]:
+    """解析 {SYMBOL}_{timeframe}_kline_{YYYYmmdd_HHMMSS}.json，返回 (symbol, timeframe, datetime)"""
+    name = os.path.basename(filename)
+    if not name.endswith('.json') or '_kline_' not in name:
+        return None
+    series, timestamp = name[:-len('.json')].rsplit('_kline_', 1)
+    if '_' not in series:
+        return None
+    symbol, timeframe = series.split('_', 1)
+    try:
+        return symbol, timeframe, datetime.strptime(timestamp, FILE_TIMESTAMP_FORMAT)
+    except ValueError:
+        return None
+
+
+class KlineFileIndex:
+    """按序列记录最新K线JSON文件的索引"""
+
+    def __init__(self, data_dir: Optional[str] = None):
+        self.data_dir = data_dir or default_data_dir()
+        self.index_dir = os.path.join(self.data_dir, 'index')
+
+    def _entry_path(self, symbol: str, timeframe: str) -> str:
+        return os.path.join(self.index_dir, f"{symbol.upper()}_{timeframe}.json")
+
+    def record(self, symbol: str, timeframe: str, filename: str) -> bool:
+        """记录序列的最新文件，写临时文件后原子替换，不同序列互不影响"""
+        try:
+            os.makedirs(self.index_dir, exist_ok=True)
+            path = self._entry_path(symbol, timeframe)
+            temp_path = f"{path}.{os.getpid()}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump({'latest': os.path.basename(filename),
+                           'updated': datetime.now().strftime(FILE_TIMESTAMP_FORMAT)}, f)
+            os.replace(temp_path, path)
+            return True
+        except Exception as e:
+            logger.error(f"更新K线文件索引失败 {symbol} {timeframe}: {e}")
+            return False
+
+    def latest_file(self, symbol: str, timeframe: str) -> Optional[str]:
+        """返回序列最新文件的完整路径
+
+        索引缺失或指向的文件已被删除时扫描目录并修复索引。
+        """
+        try:
+            with open(self._entry_path(symbol, timeframe), 'r', encoding='utf-8') as f:
+                latest = json.load(f).get('latest')
+            if latest:
+                path = os.path.join(self.data_dir, latest)
+                if os.path.exists(path):
+                    return path
+        except (OSError, ValueError):
+            pass
+
+        files = self.series_files(symbol, timeframe)
+        if not files:
+            return None
+        self.record(symbol, timeframe, files[-1])
+        return files[-1]
+
+    def series_files(self, symbol: str, timeframe: str) -> List[str]:
+        """扫描目录，返回序列的所有文件（按时间升序）"""
+        pattern = os.path.join(self.data_dir, kline_filename(symbol.upper(), timeframe, '*'))
+        return sorted(glob.glob(pattern))
+
+    def rebuild(self) -> Dict[str, str]:
+        """扫描目录重建所有序列的索引，返回 {序列: 最新文件名}"""
+        latest = {}
+        for path in sorted(glob.glob(os.path.join(self.data_dir, '*_kline_*.json'))):
+            parsed = parse_kline_filename(path)
+            if parsed:
+                symbol, timeframe, _ = parsed
+                latest[(symbol, timeframe)] = path
+        for (symbol, timeframe), path in latest.items():
+            self.record(symbol, timeframe, path)
+        return {f"{symbol}_{timeframe}": os.path.basename(path) for (symbol, timeframe), path in latest.items()}
+
+
+def compact_kline_files(data_dir: Optional[str] = None, keep_last: Optional[int] = DEFAULT_KEEP_LAST,
+                        keep_days: Optional[int] = DEFAULT_KEEP_DAYS, now: Optional[datetime] = None) -> Dict:
+    """按保留策略清理K线JSON文件
+
+    每个序列只保留同时满足两个限制的文件: 最新的keep_last个之内，且在最近keep_days天内。
+    限制为None时不生效，两者都为None时不删除；每个序列的最新文件始终保留。清理完成后重建索引。
+    """
+    index = KlineFileIndex(data_dir)
+    cutoff = (now or datetime.now()) - timedelta(days=keep_days) if keep_days is not None else None
+
+    series = {}
+    for path in glob.glob(os.path.join(index.data_dir, '*_kline_*.json')):
+        parsed = parse_kline_filename(path)
+        if parsed:
+            symbol, timeframe, created = parsed
+            series.setdefault((symbol, timeframe), []).append((created, path))
+
+    removed = 0
+    kept = 0
+    for files in series.values():
+        files.sort(reverse=True)
+        for position, (created, path) in enumerate(files):
+            keep = position == 0 or ((keep_last is None or position < keep_last)
+                                     and (cutoff is None or created >= cutoff))
+            if keep:
+                kept += 1
+                continue
+            try:
+                os.remove(path)
+                removed += 1
+            except OSError as e:
+                logger.warning(f"删除K线文件失败 {path}: {e}")
+                kept += 1
+
+    index.rebuild()
+    logger.info(f"K线文件清理完成: 删除 {removed} 个，保留 {kept} 个，共 {len(series)} 个序列")
+    return {'removed': removed, 'kept': kept, 'series': len(series)}
+
+
+_kline_file_index = None
+
+
+def get_kline_file_index() -> KlineFileIndex:
+    """获取全局K线文件索引"""
+    global _kline_file_index
+    if _kline_file_index is None:
+        _kline_file_index = KlineFileIndex()
+    return _kline_file_index
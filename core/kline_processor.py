@@ -4,7 +4,12 @@ from datetime import datetime, timedelta
 import logging
 import os
 import json
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FuturesTimeoutError
 from crypto_db import CryptoDatabase
+from kline_store import get_kline_store
+from kline_index import KlineFileIndex, kline_filename
+import indicators
 
 # 配置日志
 logging.basicConfig(
@@ -19,8 +24,13 @@ logging.basicConfig(
 class KlineProcessor:
     """K线数据处理器"""
     
-    def __init__(self):
+    def __init__(self, save_json=None):
+        """save_json: 是否额外输出带时间戳的JSON文件，默认读取环境变量 KLINE_SAVE_JSON"""
         self.db = CryptoDatabase()
+        self.store = get_kline_store()
+        if save_json is None:
+            save_json = os.getenv('KLINE_SAVE_JSON', '').strip().lower() in ('1', 'true', 'yes', 'on')
+        self.save_json = save_json
         
         # 获取项目根目录路径
         current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -28,6 +38,7 @@ class KlineProcessor:
         self.output_dir = os.path.join(project_root, "data", "kline_data")
         
         self.ensure_output_dir()
+        self.file_index = KlineFileIndex(self.output_dir)
     
     def ensure_output_dir(self):
         """确保输出目录存在"""
@@ -35,6 +46,26 @@ class KlineProcessor:
             os.makedirs(self.output_dir)
             logging.info(f"创建K线数据输出目录: {self.output_dir}")
     
+    @staticmethod
+    def _to_kline_rows(data):
+        """把数据库查询结果转换为按时间升序的K线字典列表"""
+        kline_data = []
+        for item in data:
+            symbol_db, date, open_price, high_price, low_price, close_price, volume = item
+            kline_data.append({
+                'symbol': symbol_db,
+                'date': date.isoformat() if hasattr(date, 'isoformat') else str(date),
+                'open': float(open_price),
+                'high': float(high_price),
+                'low': float(low_price),
+                'close': float(close_price),
+                'volume': float(volume)
+            })
+        
+        # 按时间排序
+        kline_data.sort(key=lambda x: x['date'])
+        return kline_data
+    
     def get_kline_data(self, symbol, timeframe, limit=100):
         """获取K线数据"""
         if not self.db.connect():
@@ -49,21 +80,7 @@ class KlineProcessor:
                 return []
             
             # 转换为K线格式
-            kline_data = []
-            for item in data:
-                symbol_db, date, open_price, high_price, low_price, close_price, volume = item
-                kline_data.append({
-                    'symbol': symbol_db,
-                    'date': date.isoformat() if hasattr(date, 'isoformat') else str(date),
-                    'open': float(open_price),
-                    'high': float(high_price),
-                    'low': float(low_price),
-                    'close': float(close_price),
-                    'volume': float(volume)
-                })
-            
-            # 按时间排序
-            kline_data.sort(key=lambda x: x['date'])
+            kline_data = self._to_kline_rows(data)
             
             logging.info(f"成功获取 {symbol} 的 {timeframe} 级K线数据，共 {len(kline_data)} 条")
             return kline_data
@@ -74,6 +91,31 @@ class KlineProcessor:
         finally:
             self.db.disconnect()
     
+    def get_kline_data_batch(self, symbols, timeframe, limit=100):
+        """使用同一个数据库连接获取多个币种的K线数据，返回 {symbol: kline_data}"""
+        connection = self.db.get_connection()
+        if not connection:
+            logging.error("数据库连接失败")
+            return {}
+        
+        kline_sets = {}
+        try:
+            for symbol in symbols:
+                data = self.db.get_historical_data(timeframe, symbol, limit, connection=connection)
+                if data:
+                    kline_sets[symbol] = self._to_kline_rows(data)
+                else:
+                    logging.warning(f"没有找到 {symbol} 的 {timeframe} 级数据")
+            return kline_sets
+        except Exception as e:
+            logging.error(f"批量获取K线数据时出错: {str(e)}")
+            return kline_sets
+        finally:
+            try:
+                connection.close()
+            except Exception:
+                pass
+    
     def calculate_technical_indicators(self, kline_data):
         """计算技术指标"""
         if not kline_data or len(kline_data) < 20:
@@ -122,92 +164,111 @@ class KlineProcessor:
         
         return indicators
     
+    def calculate_technical_indicators_batch(self, kline_sets):
+        """批量计算多个币种的技术指标
+        
+        K线数量相同的币种组成 (币种数, K线数) 的二维数组，每个指标沿最后一个轴一次算完，
+        结果按币种拆分，与逐个调用 calculate_technical_indicators 的结果一致。
+        kline_sets: {symbol: kline_data}，返回 {symbol: indicators}
+        """
+        groups = {}
+        for symbol, kline_data in kline_sets.items():
+            groups.setdefault(len(kline_data), []).append(symbol)
+        
+        results = {}
+        for length, symbols in groups.items():
+            if length < 20:
+                results.update({symbol: {} for symbol in symbols})
+                continue
+            
+            try:
+                results.update(self._calculate_indicator_group(
+                    symbols, [kline_sets[symbol] for symbol in symbols]))
+            except Exception as e:
+                logging.error(f"批量计算技术指标时出错: {str(e)}")
+                results.update({symbol: {} for symbol in symbols})
+        
+        logging.info(f"批量技术指标计算完成: {len(results)} 个币种，{len(groups)} 组")
+        return results
+    
+    def _calculate_indicator_group(self, symbols, kline_sets):
+        """对K线数量相同的一组币种计算技术指标"""
+        def column(name):
+            return np.array([[item[name] for item in kline_data] for kline_data in kline_sets], dtype=np.float64)
+        
+        closes = column('close')
+        highs = column('high')
+        lows = column('low')
+        volumes = column('volume')
+        length = closes.shape[-1]
+        
+        results = {symbol: {} for symbol in symbols}
+        
+        def put(name, values, min_length):
+            # 数据不足时与单个计算一致，整项为None
+            rows = indicators.to_list(values) if length >= min_length else [None] * len(symbols)
+            for symbol, row in zip(symbols, rows):
+                results[symbol][name] = row
+        
+        # 移动平均线
+        for period in (5, 10, 20, 50):
+            put(f'ma{period}', indicators.sma(closes, period), period)
+        
+        # RSI
+        put('rsi', indicators.rsi(closes, 14), 15)
+        
+        # MACD
+        macd_line, signal_line, histogram = indicators.macd(closes, 12, 26, 9, seed='sma')
+        put('macd', macd_line, 26)
+        put('signal', signal_line, 26)
+        put('histogram', histogram, 26)
+        
+        # 布林带
+        bb_upper, bb_middle, bb_lower = indicators.bollinger_bands(closes, 20, 2, ddof=0)
+        put('bb_upper', bb_upper, 20)
+        put('bb_middle', bb_middle, 20)
+        put('bb_lower', bb_lower, 20)
+        
+        # 成交量指标
+        put('volume_ma', indicators.sma(volumes, 20), 20)
+        
+        # 波动率
+        put('volatility', indicators.volatility(closes, 19, ddof=0), 20)
+        
+        # KDJ指标
+        k_values, d_values, j_values = indicators.kdj(highs, lows, closes, 9, 3, 3, initial=50)
+        put('k', k_values, 9)
+        put('d', d_values, 9)
+        put('j', j_values, 9)
+        
+        return results
+    
     def calculate_ma(self, data, period):
         """计算移动平均线"""
         if len(data) < period:
             return None
         
-        ma_values = []
-        for i in range(len(data)):
-            if i < period - 1:
-                ma_values.append(None)
-            else:
-                ma = sum(data[i-period+1:i+1]) / period
-                ma_values.append(ma)
-        
-        return ma_values
+        return indicators.to_list(indicators.sma(data, period))
     
     def calculate_rsi(self, data, period=14):
         """计算RSI指标"""
         if len(data) < period + 1:
             return None
         
-        deltas = [data[i] - data[i-1] for i in range(1, len(data))]
-        gains = [delta if delta > 0 else 0 for delta in deltas]
-        losses = [-delta if delta < 0 else 0 for delta in deltas]
-        
-        rsi_values = [None] * period
-        
-        # 计算初始RSI
-        avg_gain = sum(gains[:period]) / period
-        avg_loss = sum(losses[:period]) / period
-        
-        if avg_loss == 0:
-            rsi_values.append(100)
-        else:
-            rs = avg_gain / avg_loss
-            rsi = 100 - (100 / (1 + rs))
-            rsi_values.append(rsi)
-        
-        # 计算后续RSI
-        for i in range(period + 1, len(data)):
-            avg_gain = (avg_gain * (period - 1) + gains[i-1]) / period
-            avg_loss = (avg_loss * (period - 1) + losses[i-1]) / period
-            
-            if avg_loss == 0:
-                rsi_values.append(100)
-            else:
-                rs = avg_gain / avg_loss
-                rsi = 100 - (100 / (1 + rs))
-                rsi_values.append(rsi)
-        
-        return rsi_values
+        return indicators.to_list(indicators.rsi(data, period))
     
     def calculate_macd(self, data, fast=12, slow=26, signal=9):
         """计算MACD指标"""
         if len(data) < slow:
             return {'macd': None, 'signal': None, 'histogram': None}
         
-        # 计算EMA
-        ema_fast = self.calculate_ema(data, fast)
-        ema_slow = self.calculate_ema(data, slow)
-        
-        # 计算MACD线
-        macd_line = []
-        for i in range(len(data)):
-            if ema_fast[i] is not None and ema_slow[i] is not None:
-                macd_line.append(ema_fast[i] - ema_slow[i])
-            else:
-                macd_line.append(None)
-        
-        # 计算信号线
-        signal_line = self.calculate_ema([x for x in macd_line if x is not None], signal)
-        
-        # 补齐信号线长度
-        signal_full = [None] * (len(macd_line) - len(signal_line)) + signal_line
-        
-        # 计算柱状图
-        histogram = []
-        for i in range(len(macd_line)):
-            if macd_line[i] is not None and signal_full[i] is not None:
-                histogram.append(macd_line[i] - signal_full[i])
-            else:
-                histogram.append(None)
+        # 初始EMA使用SMA，信号线只对MACD线的有效部分计算
+        macd_line, signal_line, histogram = indicators.macd(data, fast, slow, signal, seed='sma')
         
         return {
-            'macd': macd_line,
-            'signal': signal_full,
-            'histogram': histogram
+            'macd': indicators.to_list(macd_line),
+            'signal': indicators.to_list(signal_line),
+            'histogram': indicators.to_list(histogram)
         }
     
     def calculate_ema(self, data, period):
@@ -215,46 +276,21 @@ class KlineProcessor:
         if len(data) < period:
             return [None] * len(data)
         
-        multiplier = 2 / (period + 1)
-        ema_values = [None] * (period - 1)
-        
         # 初始EMA使用SMA
-        sma = sum(data[:period]) / period
-        ema_values.append(sma)
-        
-        # 计算后续EMA
-        for i in range(period, len(data)):
-            ema = (data[i] * multiplier) + (ema_values[-1] * (1 - multiplier))
-            ema_values.append(ema)
-        
-        return ema_values
+        return indicators.to_list(indicators.ema(data, period, seed='sma'))
     
     def calculate_bollinger_bands(self, data, period=20, std_dev=2):
         """计算布林带"""
         if len(data) < period:
             return {'bb_upper': None, 'bb_middle': None, 'bb_lower': None}
         
-        ma_values = self.calculate_ma(data, period)
-        
-        bb_upper = []
-        bb_lower = []
-        
-        for i in range(len(data)):
-            if i < period - 1:
-                bb_upper.append(None)
-                bb_lower.append(None)
-            else:
-                # 计算标准差
-                window_data = data[i-period+1:i+1]
-                std = np.std(window_data)
-                
-                bb_upper.append(ma_values[i] + (std * std_dev))
-                bb_lower.append(ma_values[i] - (std * std_dev))
+        # 标准差与 np.std 一致（总体标准差）
+        bb_upper, bb_middle, bb_lower = indicators.bollinger_bands(data, period, std_dev, ddof=0)
         
         return {
-            'bb_upper': bb_upper,
-            'bb_middle': ma_values,
-            'bb_lower': bb_lower
+            'bb_upper': indicators.to_list(bb_upper),
+            'bb_middle': indicators.to_list(bb_middle),
+            'bb_lower': indicators.to_list(bb_lower)
         }
     
     def calculate_volatility(self, data, period=20):
@@ -262,88 +298,43 @@ class KlineProcessor:
         if len(data) < period:
             return None
         
-        volatility_values = []
-        
-        for i in range(len(data)):
-            if i < period - 1:
-                volatility_values.append(None)
-            else:
-                window_data = data[i-period+1:i+1]
-                returns = [(window_data[j] - window_data[j-1]) / window_data[j-1] 
-                          for j in range(1, len(window_data))]
-                volatility = np.std(returns) * np.sqrt(252)  # 年化波动率
-                volatility_values.append(volatility)
-        
-        return volatility_values
+        # 每个窗口内period根K线产生period-1个收益率，年化波动率
+        return indicators.to_list(indicators.volatility(data, period - 1, ddof=0))
     
     def calculate_kdj(self, highs, lows, closes, k_period=9, k_smooth=3, d_smooth=3):
         """计算KDJ指标"""
         if len(closes) < k_period:
             return {'k': None, 'd': None, 'j': None}
         
-        rsv_values = []
-        
-        # 计算RSV
-        for i in range(len(closes)):
-            if i < k_period - 1:
-                rsv_values.append(None)
-            else:
-                window_highs = highs[i-k_period+1:i+1]
-                window_lows = lows[i-k_period+1:i+1]
-                
-                highest = max(window_highs)
-                lowest = min(window_lows)
-                
-                if highest == lowest:
-                    rsv = 50
-                else:
-                    rsv = (closes[i] - lowest) / (highest - lowest) * 100
-                
-                rsv_values.append(rsv)
-        
-        # 计算K值
-        k_values = [None] * (k_period - 1)
-        k_values.append(50)  # 初始K值
-        
-        for i in range(k_period, len(rsv_values)):
-            if rsv_values[i] is not None:
-                k = (k_values[-1] * (k_smooth - 1) + rsv_values[i]) / k_smooth
-                k_values.append(k)
-            else:
-                k_values.append(None)
-        
-        # 计算D值
-        d_values = [None] * (k_period - 1)
-        d_values.append(50)  # 初始D值
-        
-        for i in range(k_period, len(k_values)):
-            if k_values[i] is not None:
-                d = (d_values[-1] * (d_smooth - 1) + k_values[i]) / d_smooth
-                d_values.append(d)
-            else:
-                d_values.append(None)
-        
-        # 计算J值
-        j_values = []
-        for i in range(len(k_values)):
-            if k_values[i] is not None and d_values[i] is not None:
-                j = 3 * k_values[i] - 2 * d_values[i]
-                j_values.append(j)
-            else:
-                j_values.append(None)
+        # 初始K值和D值为50
+        k_values, d_values, j_values = indicators.kdj(highs, lows, closes, k_period,
+                                                      k_smooth, d_smooth, initial=50)
         
         return {
-            'k': k_values,
-            'd': d_values,
-            'j': j_values
+            'k': indicators.to_list(k_values),
+            'd': indicators.to_list(d_values),
+            'j': indicators.to_list(j_values)
         }
     
     def save_kline_data(self, symbol, timeframe, kline_data, indicators=None):
-        """保存K线数据到文件"""
+        """保存K线数据到列式存储，开启 save_json 时同时输出JSON文件
+        
+        返回JSON文件路径，未输出JSON时返回列式存储目录。
+        """
+        try:
+            written = self.store.append_kline_rows(symbol, timeframe, kline_data, indicators)
+            logging.info(f"{symbol} {timeframe} 级K线写入列式存储 {written} 条")
+        except Exception as e:
+            logging.error(f"写入K线列式存储时出错: {str(e)}")
+            return None
+        
+        if not self.save_json:
+            return self.store.series_dir(symbol, timeframe)
+        
         try:
             # 创建文件名
             timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            filename = f"{symbol}_{timeframe}_kline_{timestamp}.json"
+            filename = kline_filename(symbol, timeframe, timestamp)
             filepath = os.path.join(self.output_dir, filename)
             
             # 准备保存的数据
@@ -359,6 +350,7 @@ class KlineProcessor:
             # 保存到JSON文件
             with open(filepath, 'w', encoding='utf-8') as f:
                 json.dump(save_data, f, ensure_ascii=False, indent=2)
+            self.file_index.record(symbol, timeframe, filename)
             
             logging.info(f"K线数据已保存到: {filepath}")
             return filepath
@@ -392,19 +384,144 @@ class KlineProcessor:
             'indicators': indicators
         }
 
-def run_kline_processing():
-    """运行K线数据处理"""
-    processor = KlineProcessor()
+    def process_and_save_kline_batch(self, symbols, timeframe, limit=100):
+        """批量处理并保存多个币种同一时间周期的K线数据"""
+        logging.info(f"开始批量处理 {len(symbols)} 个币种的 {timeframe} 级K线数据")
+        
+        kline_sets = self.get_kline_data_batch(symbols, timeframe, limit)
+        indicator_sets = self.calculate_technical_indicators_batch(kline_sets)
+        
+        results = []
+        for symbol, kline_data in kline_sets.items():
+            indicators_data = indicator_sets.get(symbol, {})
+            filepath = self.save_kline_data(symbol, timeframe, kline_data, indicators_data)
+            results.append({
+                'symbol': symbol,
+                'timeframe': timeframe,
+                'data_count': len(kline_data),
+                'filepath': filepath,
+                'kline_data': kline_data,
+                'indicators': indicators_data
+            })
+        return results
+
+# 并行处理的默认进程数上限，每个进程各自持有一个数据库连接池（pool_size=3，即3个连接）
+DEFAULT_KLINE_WORKERS = int(os.getenv('KLINE_WORKERS', '0')) or os.cpu_count() or 1
+# 并行处理整体超时（秒）
+DEFAULT_KLINE_TIMEOUT = 600
+
+# 工作进程内的处理器，由 _init_kline_worker 在进程启动时创建
+_worker_processor = None
+
+def _init_kline_worker():
+    """工作进程初始化: 每个进程创建自己的处理器和数据库连接池，不复用父进程的连接"""
+    global _worker_processor
+    _worker_processor = KlineProcessor()
+
+def _process_kline_task(symbol, timeframe, limit):
+    """在工作进程中处理一个 (币种, 时间周期)，返回结果和耗时"""
+    started = time.perf_counter()
+    try:
+        result = _worker_processor.process_and_save_kline(symbol, timeframe, limit)
+    except Exception as e:
+        logging.error(f"处理 {symbol} {timeframe} 级K线数据时出错: {str(e)}")
+        result = None
+    return result, {
+        'symbol': symbol,
+        'timeframe': timeframe,
+        'pid': os.getpid(),
+        'seconds': round(time.perf_counter() - started, 3),
+        'success': bool(result)
+    }
+
+def run_kline_processing_parallel(symbols, timeframes, limit=100, workers=None, timeout=DEFAULT_KLINE_TIMEOUT):
+    """用进程池并行处理 (币种, 时间周期) 网格
+    
+    workers限制同时运行的进程数（也即同时占用的数据库连接池数，每个进程3个连接，
+    共 workers*3 个连接），每个任务的耗时记录在结果的 'timing' 字段中。
+    超时后取消未开始的任务并终止工作进程，不会留下继续占用连接的进程。
+    """
+    tasks = [(symbol, timeframe) for symbol in symbols for timeframe in timeframes]
+    if not tasks:
+        return []
     
-    symbols = ['BTC', 'ETH']
-    timeframes = ['minute', 'hour', 'day']
+    workers = max(1, min(workers or DEFAULT_KLINE_WORKERS, len(tasks)))
+    logging.info(f"开始并行处理K线数据: {len(tasks)} 个任务，{workers} 个进程")
     
+    started = time.perf_counter()
     results = []
+    timings = []
+    executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_kline_worker)
+    futures = {}
+    timed_out = False
+    try:
+        futures = {
+            executor.submit(_process_kline_task, symbol, timeframe, limit): (symbol, timeframe)
+            for symbol, timeframe in tasks
+        }
+        deadline = started + timeout if timeout else None
+        for future, (symbol, timeframe) in futures.items():
+            remaining = None if deadline is None else max(0, deadline - time.perf_counter())
+            try:
+                result, timing = future.result(timeout=remaining)
+            except FuturesTimeoutError:
+                logging.error(f"处理 {symbol} {timeframe} 级K线数据超时")
+                timed_out = True
+                continue
+            except Exception as e:
+                logging.error(f"处理 {symbol} {timeframe} 级K线数据时出错: {str(e)}")
+                continue
+            
+            timings.append(timing)
+            logging.info(f"{symbol} {timeframe} 级K线数据处理{'成功' if timing['success'] else '失败'}，"
+                         f"耗时 {timing['seconds']}s (进程 {timing['pid']})")
+            if result:
+                result['timing'] = timing
+                results.append(result)
+    finally:
+        # 手动取消未开始的任务（cancel_futures 需要Python 3.9）
+        for future in futures:
+            future.cancel()
+        if timed_out:
+            # 超时的任务仍在运行，终止工作进程释放其数据库连接
+            for process in list(getattr(executor, '_processes', {}).values()):
+                process.terminate()
+        executor.shutdown(wait=timed_out)
+    
+    elapsed = time.perf_counter() - started
+    busy = sum(timing['seconds'] for timing in timings)
+    logging.info(f"K线数据并行处理完成，共处理 {len(results)}/{len(tasks)} 个数据集，"
+                 f"总耗时 {elapsed:.3f}s，任务累计耗时 {busy:.3f}s")
+    return results
+
+def run_kline_processing(symbols=None, timeframes=None, limit=100, batch=False, parallel=False, workers=None):
+    """运行K线数据处理
+    
+    batch=True 时每个时间周期一次性加载所有币种，按二维数组批量计算指标；
+    parallel=True 时按 (币种, 时间周期) 分发到进程池并行处理。
+    """
+    symbols = symbols or ['BTC', 'ETH']
+    timeframes = timeframes or ['minute', 'hour', 'day']
+    
+    if parallel:
+        return run_kline_processing_parallel(symbols, timeframes, limit, workers)
+    
+    processor = KlineProcessor()
+    results = []
+    
+    if batch:
+        for timeframe in timeframes:
+            try:
+                results.extend(processor.process_and_save_kline_batch(symbols, timeframe, limit))
+            except Exception as e:
+                logging.error(f"批量处理 {timeframe} 级K线数据时出错: {str(e)}")
+        logging.info(f"K线数据批量处理完成，共处理 {len(results)} 个数据集")
+        return results
     
     for symbol in symbols:
         for timeframe in timeframes:
             try:
-                result = processor.process_and_save_kline(symbol, timeframe, 100)
+                result = processor.process_and_save_kline(symbol, timeframe, limit)
                 if result:
                     results.append(result)
                     logging.info(f"成功处理 {symbol} {timeframe} 级K线数据")
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+K线列式存储
+每个 (币种, 时间周期) 一个目录 data/kline_store/{SYMBOL}_{timeframe}/，每列一个定长二进制文件:
+  ts.i8      K线时间戳（毫秒，int64）
+  open.f8 …  OHLCV和技术指标（float64，未定义的指标为NaN）
+  meta.json  列信息、已提交的行数和写入代数
+
+写入只追加时间戳更新的K线，最后一根（可能未收盘的）K线原位覆盖；
+行数在所有列写完后才通过 meta.json 原子替换提交，追加的行在提交前对读取方不可见。
+原位覆盖前先把代数（generation）提交为奇数，写完后提交为偶数（顺序锁），
+需要一致快照的读取在代数为奇数或读取前后代数变化时重试。
+读取通过内存映射返回各列的切片，copy=False 时不复制数据。
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+TIMESTAMP_COLUMN = 'ts'
+PRICE_COLUMNS = ('open', 'high', 'low', 'close', 'volume')
+# 与 KlineProcessor.calculate_technical_indicators 的输出一致
+INDICATOR_COLUMNS = ('ma5', 'ma10', 'ma20', 'ma50', 'rsi', 'macd', 'signal', 'histogram',
+                     'bb_upper', 'bb_middle', 'bb_lower', 'volume_ma', 'volatility', 'k', 'd', 'j')
+VALUE_COLUMNS = PRICE_COLUMNS + INDICATOR_COLUMNS
+
+TIMESTAMP_DTYPE = np.dtype('<i8')
+VALUE_DTYPE = np.dtype('<f8')
+FORMAT_VERSION = 1
+# 一致快照读取的最大重试次数
+SNAPSHOT_RETRIES = 50
+
+
+def default_store_dir() -> str:
+    """项目根目录下的 data/kline_store"""
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    project_root = os.path.dirname(current_dir)
+    return os.path.join(project_root, 'data', 'kline_store')
+
+
+def to_timestamp_ms(date) -> int:
+    """把K线时间（datetime/pandas.Timestamp/isoformat字符串）转换为毫秒时间戳
+
+    数据库中的时间为本地时间，按本地时间解释，与 rows_to_kline 的数据库路径一致
+    （pandas.Timestamp.timestamp() 会把无时区时间当作UTC，需先转换为datetime）。
+    """
+    if isinstance(date, str):
+        date = datetime.fromisoformat(date)
+    if hasattr(date, 'to_pydatetime'):
+        date = date.to_pydatetime()
+    return int(date.timestamp() * 1000)
+
+
+class KlineStore:
+    """按 (币种, 时间周期) 分目录的追加写列式K线存储"""
+
+    def __init__(self, root: Optional[str] = None):
+        self.root = root or default_store_dir()
+        self._lock = threading.Lock()
+
+    def series_dir(self, symbol: str, timeframe: str) -> str:
+        return os.path.join(self.root, f"{symbol.upper()}_{timeframe}")
+
+    @staticmethod
+    def _column_path(directory: str, column: str) -> str:
+        suffix = 'i8' if column == TIMESTAMP_COLUMN else 'f8'
+        return os.path.join(directory, f"{column}.{suffix}")
+
+    def _read_meta(self, directory: str) -> Dict:
+        try:
+            with open(os.path.join(directory, 'meta.json'), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {'version': FORMAT_VERSION, 'columns': list(VALUE_COLUMNS), 'count': 0, 'generation': 0}
+
+    @staticmethod
+    def _write_meta(directory: str, meta: Dict):
+        path = os.path.join(directory, 'meta.json')
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(temp_path, path)
+
+    def count(self, symbol: str, timeframe: str) -> int:
+        """已提交的K线数量"""
+        return self._read_meta(self.series_dir(symbol, timeframe))['count']
+
+    def _column(self, directory: str, column: str, count: int) -> np.ndarray:
+        dtype = TIMESTAMP_DTYPE if column == TIMESTAMP_COLUMN else VALUE_DTYPE
+        if count == 0:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(self._column_path(directory, column), dtype=dtype, mode='r', shape=(count,))
+
+    def append(self, symbol: str, timeframe: str, timestamps, columns: Dict) -> int:
+        """追加K线，返回写入（追加或覆盖）的行数
+
+        timestamps: 按时间升序的毫秒时间戳
+        columns: {列名: 与timestamps等长的数值序列}，None表示未定义，缺少的列写入NaN
+        早于已存储最后一根K线的数据会被忽略。
+        """
+        timestamps = np.asarray(timestamps, dtype=TIMESTAMP_DTYPE)
+        if not len(timestamps):
+            return 0
+
+        directory = self.series_dir(symbol, timeframe)
+        with self._lock:
+            os.makedirs(directory, exist_ok=True)
+            meta = self._read_meta(directory)
+            count = meta['count']
+
+            # 只保留时间戳不早于最后一根已存储K线的数据
+            start_row = count
+            if count:
+                last_ts = self._column(directory, TIMESTAMP_COLUMN, count)[-1]
+                keep = timestamps >= last_ts
+                if not keep.any():
+                    return 0
+                first = int(np.argmax(keep))
+                if timestamps[first] == last_ts:
+                    start_row = count - 1
+                timestamps = timestamps[first:]
+            else:
+                first = 0
+
+            new_count = start_row + len(timestamps)
+            values = {TIMESTAMP_COLUMN: timestamps}
+            for column in VALUE_COLUMNS:
+                data = columns.get(column)
+                if data is None:
+                    values[column] = np.full(len(timestamps), np.nan, dtype=VALUE_DTYPE)
+                else:
+                    values[column] = np.array(data[first:], dtype=VALUE_DTYPE)
+
+            # 覆盖已提交的行之前先标记写入中，读取方据此重试
+            overwrite = start_row < count
+            if overwrite:
+                # 上次写入中断时代数可能仍为奇数
+                meta['generation'] = meta.get('generation', 0) // 2 * 2 + 1
+                self._write_meta(directory, meta)
+
+            for column, data in values.items():
+                path = self._column_path(directory, column)
+                mode = 'r+b' if os.path.exists(path) else 'w+b'
+                with open(path, mode) as f:
+                    f.seek(start_row * data.dtype.itemsize)
+                    f.write(data.tobytes())
+                    f.truncate(new_count * data.dtype.itemsize)
+
+            meta['count'] = new_count
+            if overwrite:
+                meta['generation'] += 1
+            self._write_meta(directory, meta)
+            return len(timestamps)
+
+    def append_kline_rows(self, symbol: str, timeframe: str, kline_data: List[Dict],
+                          indicators: Optional[Dict] = None) -> int:
+        """追加 KlineProcessor 格式的K线字典列表和技术指标"""
+        if not kline_data:
+            return 0
+        timestamps = [to_timestamp_ms(item['date']) for item in kline_data]
+        columns = {column: [item[column] for item in kline_data] for column in PRICE_COLUMNS}
+        for column in INDICATOR_COLUMNS:
+            series = (indicators or {}).get(column)
+            if series is not None and len(series) == len(kline_data):
+                columns[column] = [np.nan if value is None else value for value in series]
+        return self.append(symbol, timeframe, timestamps, columns)
+
+    def read(self, symbol: str, timeframe: str, limit: Optional[int] = None,
+             columns=None, copy: bool = False) -> Dict[str, np.ndarray]:
+        """读取最近limit根K线的各列，存储不存在时返回空字典
+
+        copy=False 返回内存映射的切片，不复制数据；最后一根K线被覆盖时切片中的值会随之变化。
+        copy=True 在写入代数不变的前提下复制出一致的快照，多次重试仍失败时返回空字典。
+        """
+        directory = self.series_dir(symbol, timeframe)
+        names = [TIMESTAMP_COLUMN] + list(columns or VALUE_COLUMNS)
+        for _ in range(SNAPSHOT_RETRIES if copy else 1):
+            meta = self._read_meta(directory)
+            count = meta['count']
+            if not count:
+                return {}
+            generation = meta.get('generation', 0)
+            if copy and generation % 2:
+                time.sleep(0.001)
+                continue
+
+            start = max(0, count - limit) if limit else 0
+            try:
+                data = {name: self._column(directory, name, count)[start:] for name in names}
+            except (OSError, ValueError) as e:
+                logger.error(f"读取K线存储失败 {directory}: {e}")
+                return {}
+            if not copy:
+                return data
+
+            data = {name: np.array(values) for name, values in data.items()}
+            if self._read_meta(directory).get('generation', 0) == generation:
+                return data
+
+        logger.warning(f"读取K线存储时持续有写入，放弃读取 {directory}")
+        return {}
+
+    def read_kline(self, symbol: str, timeframe: str, limit: Optional[int] = None) -> List[List]:
+        """读取最近limit根K线，返回 KlineBackend 使用的 [timestamp, open, high, low, close, volume] 数组"""
+        data = self.read(symbol, timeframe, limit, PRICE_COLUMNS, copy=True)
+        if not data:
+            return []
+        rows = np.column_stack([data[column] for column in PRICE_COLUMNS]).tolist()
+        for row, timestamp in zip(rows, data[TIMESTAMP_COLUMN].tolist()):
+            row.insert(0, timestamp)
+        return rows
+
+
+_kline_store = None
+
+
+def get_kline_store() -> KlineStore:
+    """获取全局K线存储实例"""
+    global _kline_store
+    if _kline_store is None:
+        _kline_store = KlineStore()
+    return _kline_store
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+进程内一级缓存 (L1)
+位于Redis之前的有界LRU+TTL缓存，并通过Redis发布/订阅在多个Web进程间同步失效
+"""
+
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 缓存失效频道，消息为JSON键列表，["*"] 表示清空全部L1
+INVALIDATION_CHANNEL = "crypto:invalidate"
+INVALIDATE_ALL = "*"
+
+
+class LocalCache:
+    """线程安全的有界LRU+TTL缓存"""
+
+    def __init__(self, max_entries: int = 512, default_ttl: float = 30):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self._epoch = 0  # 每次失效递增，用于丢弃失效前读取到的旧值
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        """获取缓存值，未命中或已过期返回None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def token(self) -> int:
+        """获取当前失效代数，配合 set(token=...) 使用"""
+        return self._epoch
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None,
+            token: Optional[int] = None):
+        """写入缓存，超出容量时淘汰最久未使用的条目
+
+        传入token时，若读取Redis期间发生过失效则放弃写入，
+        避免把失效前读到的旧值回填进L1。
+        """
+        expires_at = time.monotonic() + (ttl if ttl is not None else self.default_ttl)
+        with self._lock:
+            if token is not None and token != self._epoch:
+                return
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, *keys: str) -> int:
+        """删除指定键，返回实际删除的数量"""
+        deleted = 0
+        with self._lock:
+            self._epoch += 1
+            for key in keys:
+                if self._entries.pop(key, None) is not None:
+                    deleted += 1
+        return deleted
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._epoch += 1
+            self._entries.clear()
+
+    def invalidate(self, keys: Iterable[str]):
+        """按失效消息清除条目"""
+        keys = list(keys)
+        if INVALIDATE_ALL in keys:
+            self.clear()
+        else:
+            self.delete(*keys)
+
+    def stats(self) -> Dict:
+        """获取L1缓存统计"""
+        with self._lock:
+            size = len(self._entries)
+        total = self.hits + self.misses
+        return {
+            'entries': size,
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / total, 4) if total else 0.0
+        }
+
+
+class PubSubListener:
+    """Redis发布/订阅监听线程
+
+    在后台线程中订阅一个或多个频道，并把消息分发给对应的处理函数。
+    连接断开后自动重连，重连时调用 on_reconnect（例如清空L1，
+    因为断线期间可能错过了失效消息）。
+    """
+
+    def __init__(self, redis_manager, handlers: Dict[str, Callable[[str], None]],
+                 on_reconnect: Optional[Callable[[], None]] = None):
+        self.redis_manager = redis_manager
+        self.handlers = dict(handlers)
+        self.on_reconnect = on_reconnect
+        self._thread = None
+        self._stop = threading.Event()
+        self._subscribed = threading.Event()
+
+    @property
+    def subscribed(self) -> bool:
+        """当前是否已订阅（连接断开或线程停止时为False）"""
+        return self._subscribed.is_set()
+
+    def start(self):
+        """启动监听线程（重复调用无副作用）"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="redis-pubsub-listener", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """停止监听线程"""
+        self._stop.set()
+        self._subscribed.clear()
+
+    def _run(self):
+        retry_delay = 1
+        while not self._stop.is_set():
+            client = self.redis_manager.redis_client
+            if client is None:
+                self._stop.wait(retry_delay)
+                retry_delay = min(retry_delay * 2, 30)
+                continue
+
+            pubsub = None
+            try:
+                pubsub = client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(*self.handlers.keys())
+                self._subscribed.set()
+                logger.info(f"已订阅缓存频道: {', '.join(self.handlers)}")
+                if self.on_reconnect:
+                    self.on_reconnect()
+                retry_delay = 1
+
+                while not self._stop.is_set():
+                    message = pubsub.get_message(timeout=1.0)
+                    if not message or message.get('type') != 'message':
+                        continue
+                    handler = self.handlers.get(message['channel'])
+                    if handler:
+                        try:
+                            handler(message['data'])
+                        except Exception as e:
+                            logger.error(f"处理频道消息失败 {message['channel']}: {e}")
+            except Exception as e:
+                self._subscribed.clear()
+                logger.warning(f"发布/订阅连接中断，{retry_delay}秒后重连: {e}")
+                if self.on_reconnect:
+                    self.on_reconnect()
+                self._stop.wait(retry_delay)
+                retry_delay = min(retry_delay * 2, 30)
+            finally:
+                self._subscribed.clear()
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except Exception:
+                        pass
+
+
+def parse_invalidation_message(data: str) -> list:
+    """解析失效消息为键列表"""
+    try:
+        keys = json.loads(data)
+    except (TypeError, json.JSONDecodeError):
+        return [INVALIDATE_ALL]
+    if isinstance(keys, str):
+        return [keys]
+    return list(keys)
@@ -10,6 +10,7 @@ from crypto_db import rebuild_database
 from data_processor import run_data_processing
 from crypto_analyzer import run_analysis
 from kline_processor import run_kline_processing
+from kline_index import compact_kline_files
 from crypto_web_app import app
 from realtime_processor import run_realtime_processor
 
@@ -122,6 +123,9 @@ class CryptoSystem:
                 logging.info("完整分析报告生成完成")
             else:
                 logging.error("完整分析报告生成失败")
+            
+            # 按保留策略清理历史K线文件
+            compact_kline_files()
                 
         except Exception as e:
             logging.error(f"完整处理流程异常: {str(e)}")
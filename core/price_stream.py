@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+实时价格推送
+实时处理器写入最新价格后向 PRICE_CHANNEL 发布一条消息，
+每个Web进程只有一个订阅线程，收到消息后把编码好的SSE帧分发给所有连接的客户端队列，
+客户端连接不会读取数据库或缓存
+"""
+
+import json
+import queue
+import threading
+import time
+from typing import Dict, List, Optional
+import logging
+
+from local_cache import PubSubListener
+
+logger = logging.getLogger(__name__)
+
+# 最新价格频道，消息为 {"id": 毫秒时间戳, "data": [最新价格...]}
+PRICE_CHANNEL = "crypto:prices"
+# 每个客户端最多积压的消息数，客户端处理不过来时丢弃最旧的消息
+CLIENT_QUEUE_SIZE = 16
+# 没有新消息时发送心跳注释的间隔（秒），防止代理断开空闲连接
+HEARTBEAT_INTERVAL = 15
+# 客户端断线后重连的等待时间（毫秒）
+RETRY_MS = 5000
+
+
+def publish_prices(redis_manager, prices: List[Dict]) -> int:
+    """发布最新价格，返回收到消息的订阅者数量"""
+    message = json.dumps({'id': int(time.time() * 1000), 'data': prices}, ensure_ascii=False)
+    return redis_manager.publish(PRICE_CHANNEL, message)
+
+
+def format_event(data: str, event_id=None, event: str = 'prices') -> str:
+    """编码一条SSE消息"""
+    lines = [f"event: {event}"]
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.extend(f"data: {line}" for line in data.splitlines() or [''])
+    return '\n'.join(lines) + '\n\n'
+
+
+class PriceBroadcaster:
+    """把价格频道的消息分发给所有SSE客户端"""
+
+    def __init__(self, redis_manager, max_clients: int = 1000):
+        self.redis_manager = redis_manager
+        self.max_clients = max_clients
+        self._clients = set()
+        self._lock = threading.Lock()
+        self._last_frame = None
+        self._listener = PubSubListener(redis_manager, {PRICE_CHANNEL: self._on_message})
+
+    def start(self):
+        self._listener.start()
+
+    def stop(self):
+        self._listener.stop()
+
+    @property
+    def client_count(self) -> int:
+        return len(self._clients)
+
+    def is_available(self) -> bool:
+        """Redis已连接且订阅线程已订阅价格频道时才能推送"""
+        return self._listener.subscribed and self.redis_manager.is_connected()
+
+    def is_full(self) -> bool:
+        return self.client_count >= self.max_clients
+
+    def _on_message(self, data: str):
+        """每条消息只编码一次，所有客户端共享同一个SSE帧"""
+        try:
+            event_id = json.loads(data).get('id')
+        except (TypeError, ValueError, AttributeError):
+            logger.warning("忽略无法解析的价格消息")
+            return
+        frame = format_event(data, event_id)
+
+        with self._lock:
+            self._last_frame = frame
+            clients = list(self._clients)
+        for client in clients:
+            try:
+                client.put_nowait(frame)
+            except queue.Full:
+                try:
+                    client.get_nowait()
+                    client.put_nowait(frame)
+                except (queue.Empty, queue.Full):
+                    pass
+
+    def subscribe(self) -> Optional[queue.Queue]:
+        """注册客户端，超过连接上限时返回None；新客户端会先收到最近一条消息"""
+        client = queue.Queue(maxsize=CLIENT_QUEUE_SIZE)
+        with self._lock:
+            if len(self._clients) >= self.max_clients:
+                return None
+            self._clients.add(client)
+            if self._last_frame is not None:
+                client.put_nowait(self._last_frame)
+        return client
+
+    def unsubscribe(self, client: queue.Queue):
+        with self._lock:
+            self._clients.discard(client)
+
+    def stream(self, heartbeat: float = HEARTBEAT_INTERVAL):
+        """SSE响应体生成器
+        
+        开始迭代时才注册客户端，响应在发送前被关闭时不会占用连接数；
+        客户端断开（生成器关闭）时自动注销。订阅中断时结束响应，
+        浏览器重连后收到503并回退到轮询。
+        """
+        client = self.subscribe()
+        if client is None:
+            return
+        try:
+            yield f"retry: {RETRY_MS}\n\n"
+            while True:
+                try:
+                    yield client.get(timeout=heartbeat)
+                except queue.Empty:
+                    if not self._listener.subscribed:
+                        return
+                    yield ": ping\n\n"
+        finally:
+            self.unsubscribe(client)
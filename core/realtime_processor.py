@@ -8,6 +8,7 @@ import logging
 from crypto_scraper import scrape_realtime_crypto_data
 from crypto_db import CryptoDatabase
 from simple_redis_manager import get_cache_manager
+from cache_warmer import CacheWarmer
 from datetime import datetime
 import time
 
@@ -25,6 +26,7 @@ class RealtimeDataProcessor:
     def __init__(self):
         self.db = CryptoDatabase()
         self.cache_manager = get_cache_manager()
+        self.cache_warmer = CacheWarmer(self.db, self.cache_manager)
     
     def process_and_store_realtime_data(self):
         """处理并存储实时数据"""
@@ -75,27 +77,15 @@ class RealtimeDataProcessor:
                 }
                 cache_ready_data.append(cache_item)
             
-            # 缓存整体实时价格列表
-            if self.cache_manager.cache_realtime_prices(cache_ready_data):
-                logging.info("实时价格列表缓存成功")
+            # 整体列表与单个币种数据通过一次pipeline写入
+            if self.cache_manager.cache_realtime_batch(cache_ready_data):
+                logging.info(f"实时价格缓存成功: {len(cache_ready_data)} 个币种")
             else:
-                logging.warning("实时价格列表缓存失败")
+                logging.warning("实时价格缓存失败")
             
-            # 缓存单个币种的实时数据
-            for data in realtime_data:
-                cache_data = {
-                    'symbol': data['symbol'],
-                    'name': data['name'],
-                    'price': data['price'],
-                    'change_24h': data['change_24h'],
-                    'timestamp': data['timestamp'].isoformat(),
-                    'cached_at': datetime.now().isoformat()
-                }
-                
-                if self.cache_manager.cache_realtime_price(data['symbol'], cache_data):
-                    logging.info(f"实时数据缓存成功: {data['symbol']}")
-                else:
-                    logging.warning(f"实时数据缓存失败: {data['symbol']}")
+            # 预热最新价格缓存
+            if not self.cache_warmer.warm_latest_prices(connection=self.db.connection):
+                logging.warning("最新价格缓存预热失败")
             
             logging.info("实时数据处理和存储完成")
             return True
@@ -1,52 +1,153 @@
 #!/usr/bin/env python3
 """
 简化版Redis缓存管理器
-只使用基础Redis功能，不依赖集群库
+默认使用单节点Redis，设置 cluster=True（或环境变量 REDIS_CLUSTER=1）时使用Redis Cluster
+
+所有与币种相关的键都带有哈希标签，例如 crypto:{BTC}:chart:hour，
+同一币种的键落在同一个槽位上，批量读写不会跨分片
+
+图表/K线/指标结果的键带有数据版本号，例如 crypto:{BTC}:chart:hour:v42，
+入库流程写好新版本的数据后原子递增 crypto:{BTC}:version:hour，
+读取方总是命中完整的缓存条目，旧版本的键随TTL自然过期
 """
 
 import json
 import time
 import hashlib
+import functools
+import threading
 import os
-from typing import Any, Optional, Dict
+from typing import Any, Optional, Dict, List
 import logging
+from cache_codec import (encode_value, decode_value, wrap_payload, JsonCodec,
+                         DEFAULT_COMPRESS_THRESHOLD)
+from cache_metrics import CacheMetrics, namespace_of
+from local_cache import (LocalCache, PubSubListener, INVALIDATION_CHANNEL,
+                         INVALIDATE_ALL, parse_invalidation_message)
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+def symbol_key(symbol: str, *parts) -> str:
+    """生成带哈希标签的币种缓存键: crypto:{SYMBOL}:part1:part2"""
+    return "crypto:{%s}:%s" % (symbol.upper(), ':'.join(str(part) for part in parts))
+
+# 键中带有数据版本号的命名空间
+VERSIONED_NAMESPACES = ('chart', 'kline', 'kline_payload')
+
+def version_key(symbol: str, timeframe: str) -> str:
+    """(币种, 时间周期) 的当前数据版本（读取方使用的版本）"""
+    return symbol_key(symbol, "version", timeframe)
+
+def version_seq_key(symbol: str, timeframe: str) -> str:
+    """(币种, 时间周期) 的版本号分配计数器，保证预留的版本号不重复"""
+    return symbol_key(symbol, "version_seq", timeframe)
+
+# 预留一个大于当前版本的新版本号；ARGV[1]为'1'时同时发布为当前版本
+# KEYS[1]: 分配计数器  KEYS[2]: 当前版本
+RESERVE_VERSION_SCRIPT = """
+local version = redis.call('INCR', KEYS[1])
+local current = tonumber(redis.call('GET', KEYS[2]) or '0')
+if version <= current then
+    version = current + 1
+    redis.call('SET', KEYS[1], version)
+end
+if ARGV[1] == '1' then
+    redis.call('SET', KEYS[2], version)
+end
+return version
+"""
+# 只有比当前版本更新时才发布，KEYS[1]: 当前版本  ARGV[1]: 预留的版本号
+PUBLISH_VERSION_SCRIPT = """
+local current = tonumber(redis.call('GET', KEYS[1]) or '0')
+if tonumber(ARGV[1]) > current then
+    redis.call('SET', KEYS[1], ARGV[1])
+    return 1
+end
+return 0
+"""
+
+def slice_chart_rows(rows: list, limit: Optional[int] = None,
+                     start: Optional[str] = None, end: Optional[str] = None) -> list:
+    """从按时间倒序排列的图表窗口中截取时间范围 [start, end] 内最近的limit行
+    
+    start/end 为 '%Y-%m-%d %H:%M:%S' 格式的字符串，可以直接按字典序比较。
+    """
+    if start is not None or end is not None:
+        rows = [row for row in rows
+                if (start is None or row['date'] >= start) and (end is None or row['date'] <= end)]
+    return rows[:limit] if limit is not None else rows
+
+def _env_flag(name: str) -> bool:
+    return os.getenv(name, '').strip().lower() in ('1', 'true', 'yes', 'on')
+
 class SimpleRedisManager:
     """简化版Redis缓存管理器"""
     
-    def __init__(self, host='192.168.73.130', port=7001, db=0):
-        """初始化Redis连接"""
+    def __init__(self, host='192.168.73.130', port=7001, db=0,
+                 compress_threshold=None, cluster=None):
+        """初始化Redis连接
+        
+        compress_threshold: 序列化后超过该字节数的值会被压缩，
+        默认读取环境变量 CACHE_COMPRESS_THRESHOLD，设为0表示关闭压缩。
+        cluster: 是否使用Redis Cluster客户端，默认读取环境变量 REDIS_CLUSTER。
+        """
+        self.cluster = _env_flag('REDIS_CLUSTER') if cluster is None else cluster
+        if compress_threshold is None:
+            compress_threshold = int(os.getenv('CACHE_COMPRESS_THRESHOLD', DEFAULT_COMPRESS_THRESHOLD))
+        self.compress_threshold = compress_threshold or None
         self.redis_client = None
+        self.binary_client = None  # 不解码响应，用于读写二进制编码值
+        self.metrics = CacheMetrics()
         self.host = host
         self.port = port
         self.db = db
         self._connect()
     
-    def _connect(self):
-        """连接到Redis"""
-        try:
-            import redis
-            self.redis_client = redis.Redis(
-                host=self.host, 
-                port=self.port, 
-                db=self.db, 
-                decode_responses=True,
+    def _create_client(self, decode_responses: bool):
+        """创建单节点或集群客户端"""
+        if self.cluster:
+            try:
+                from redis.cluster import RedisCluster
+            except ImportError:
+                # redis-py < 4.1 使用 redis-py-cluster
+                from rediscluster import RedisCluster
+            return RedisCluster(
+                host=self.host,
+                port=self.port,
+                decode_responses=decode_responses,
                 socket_timeout=5,
                 socket_connect_timeout=5
             )
+        
+        import redis
+        return redis.Redis(
+            host=self.host, 
+            port=self.port, 
+            db=self.db, 
+            decode_responses=decode_responses,
+            socket_timeout=5,
+            socket_connect_timeout=5
+        )
+    
+    def _connect(self):
+        """连接到Redis"""
+        try:
+            self.redis_client = self._create_client(decode_responses=True)
+            self.binary_client = self._create_client(decode_responses=False)
             # 测试连接
             self.redis_client.ping()
-            logger.info(f"✅ Redis连接成功: {self.host}:{self.port}")
+            mode = "集群" if self.cluster else "单节点"
+            logger.info(f"✅ Redis连接成功({mode}): {self.host}:{self.port}")
         except ImportError:
             logger.error("❌ Redis库未安装，请运行: sudo apt install python3-redis")
             self.redis_client = None
+            self.binary_client = None
         except Exception as e:
             logger.error(f"❌ Redis连接失败: {e}")
             self.redis_client = None
+            self.binary_client = None
     
     def is_connected(self) -> bool:
         """检查Redis连接状态"""
@@ -58,26 +159,59 @@ class SimpleRedisManager:
         except:
             return False
     
-    def set(self, key: str, value: Any, expire: Optional[int] = None) -> bool:
-        """设置缓存"""
+    @staticmethod
+    def _serialize(value: Any) -> str:
+        """序列化缓存值"""
+        if isinstance(value, (dict, list)):
+            return json.dumps(value, ensure_ascii=False)
+        return str(value)
+    
+    def _encode(self, value: Any, codec: Optional[str] = None):
+        """编码待写入的值
+        
+        小值按JSON文本写入（与旧格式一致）；指定编解码器或超过压缩阈值时
+        写入带版本头的二进制值，由 get() 自动识别。
+        """
+        if codec:
+            return encode_value(value, codec, self.compress_threshold)
+        serialized = self._serialize(value)
+        if self.compress_threshold and len(serialized) >= self.compress_threshold:
+            return wrap_payload(serialized.encode('utf-8'), JsonCodec.codec_id, self.compress_threshold)
+        return serialized
+    
+    @staticmethod
+    def _payload_size(value) -> int:
+        """序列化后的字节数"""
+        if isinstance(value, bytes):
+            return len(value)
+        return len(value.encode('utf-8'))
+    
+    def set(self, key: str, value: Any, expire: Optional[int] = None,
+            codec: Optional[str] = None) -> bool:
+        """设置缓存
+        
+        codec为None时按JSON文本写入；指定编解码器名称（如'columnar'）时
+        写入带版本头的二进制编码值。超过压缩阈值的值会被透明压缩。
+        """
         if not self.is_connected():
             return False
         
+        started = time.perf_counter()
         try:
             # 序列化数据
-            if isinstance(value, (dict, list)):
-                serialized_value = json.dumps(value, ensure_ascii=False)
-            else:
-                serialized_value = str(value)
+            serialized_value = self._encode(value, codec)
             
-            # 设置缓存
+            # 设置缓存（二进制客户端同样可以写入文本值）
             if expire:
-                result = self.redis_client.setex(key, expire, serialized_value)
+                result = self.binary_client.setex(key, expire, serialized_value)
             else:
-                result = self.redis_client.set(key, serialized_value)
+                result = self.binary_client.set(key, serialized_value)
             
+            self.metrics.record_set(key, time.perf_counter() - started,
+                                    self._payload_size(serialized_value))
             return bool(result)
         except Exception as e:
+            self.metrics.record_error(key)
             logger.error(f"设置缓存失败 {key}: {e}")
             return False
     
@@ -86,20 +220,111 @@ class SimpleRedisManager:
         if not self.is_connected():
             return None
         
+        started = time.perf_counter()
         try:
-            value = self.redis_client.get(key)
-            if value is None:
-                return None
-            
-            # 尝试反序列化JSON
-            try:
-                return json.loads(value)
-            except json.JSONDecodeError:
-                return value
+            # 以原始字节读取，同时兼容二进制编码值与旧的JSON文本
+            raw = self.binary_client.get(key)
+            value = decode_value(raw)
+            self.metrics.record_get(key, time.perf_counter() - started,
+                                    None if raw is None else len(raw))
+            return value
         except Exception as e:
+            self.metrics.record_error(key)
             logger.error(f"获取缓存失败 {key}: {e}")
             return None
     
+    def pipeline(self, transaction: bool = True, binary: bool = False):
+        """创建pipeline
+        
+        集群模式下不使用MULTI事务（旧版集群客户端不支持），
+        依靠哈希标签保证同一币种的命令发往同一节点。
+        """
+        client = self.binary_client if binary else self.redis_client
+        if self.cluster:
+            return client.pipeline(transaction=False)
+        return client.pipeline(transaction=transaction)
+    
+    def scan_keys(self, pattern: str) -> List[str]:
+        """使用SCAN查找匹配的键（集群模式下遍历所有主节点）"""
+        if not self.redis_client:
+            return []
+        return list(self.redis_client.scan_iter(match=pattern, count=500))
+    
+    def info(self, section: str) -> Dict:
+        """获取INFO信息，集群模式下返回第一个节点的信息"""
+        info = self.redis_client.info(section)
+        if self.cluster and info and all(isinstance(value, dict) for value in info.values()):
+            return next(iter(info.values()))
+        return info
+    
+    def set_many(self, mapping: Dict[str, Any], expire: Optional[int] = None,
+                 codec: Optional[str] = None) -> bool:
+        """批量设置缓存，所有键在一次往返中写入
+        
+        有过期时间时使用pipeline批量SETEX，否则使用MSET。
+        集群模式下使用pipeline（按节点分组发送），新旧两种集群客户端都支持。
+        批量接口不做ping检查，避免额外的一次往返。
+        """
+        if not self.redis_client or not mapping:
+            return False
+        
+        started = time.perf_counter()
+        try:
+            serialized = {key: self._encode(value, codec) for key, value in mapping.items()}
+            if expire or self.cluster:
+                pipe = self.pipeline(transaction=False, binary=True)
+                for key, value in serialized.items():
+                    if expire:
+                        pipe.setex(key, expire, value)
+                    else:
+                        pipe.set(key, value)
+                result = all(pipe.execute())
+            else:
+                result = bool(self.binary_client.mset(serialized))
+            
+            # 批量操作的延迟只计入第一个键所在的命名空间一次
+            elapsed = time.perf_counter() - started
+            for index, (key, value) in enumerate(serialized.items()):
+                self.metrics.record_set(key, elapsed if index == 0 else None, self._payload_size(value))
+            return result
+        except Exception as e:
+            for key in mapping:
+                self.metrics.record_error(key)
+            logger.error(f"批量设置缓存失败 ({len(mapping)} 个键): {e}")
+            return False
+    
+    def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        """批量获取缓存（MGET），只返回命中的键"""
+        if not self.redis_client or not keys:
+            return {}
+        
+        started = time.perf_counter()
+        try:
+            if self.cluster:
+                # 跨槽位的键不能用MGET，通过pipeline按节点分组读取
+                pipe = self.pipeline(transaction=False, binary=True)
+                for key in keys:
+                    pipe.get(key)
+                values = pipe.execute()
+            else:
+                values = self.binary_client.mget(keys)
+            result = {}
+            for key, value in zip(keys, values):
+                if value is not None:
+                    result[key] = decode_value(value)
+            
+            # 批量操作的延迟只计入第一个键所在的命名空间一次
+            elapsed = time.perf_counter() - started
+            for index, (key, value) in enumerate(zip(keys, values)):
+                self.metrics.record_get(key, elapsed if index == 0 else None,
+                                        None if value is None else len(value))
+            return result
+        except Exception as e:
+            for key in keys:
+                self.metrics.record_error(key)
+            logger.error(f"批量获取缓存失败 ({len(keys)} 个键): {e}")
+            return {}
+    
     def delete(self, *keys: str) -> int:
         """删除缓存"""
         if not self.is_connected():
@@ -143,114 +368,431 @@ class SimpleRedisManager:
         except Exception as e:
             logger.error(f"获取TTL失败 {key}: {e}")
             return -1
+    
+    def acquire_lock(self, name: str, timeout: int = 10):
+        """非阻塞获取分布式锁
+        
+        成功返回锁对象，锁被其他调用方持有时返回None，
+        Redis不可用（未连接或命令出错）时返回False，调用方可据此不再等待锁。
+        """
+        if not self.redis_client:
+            return False
+        
+        try:
+            # 锁可能在后台刷新线程中释放，不能使用线程本地token
+            lock = self.redis_client.lock(name, timeout=timeout, thread_local=False)
+            return lock if lock.acquire(blocking=False) else None
+        except Exception as e:
+            logger.error(f"获取锁失败 {name}: {e}")
+            return False
+    
+    def release_lock(self, lock) -> None:
+        """释放分布式锁，锁已过期时忽略"""
+        try:
+            lock.release()
+        except Exception as e:
+            logger.warning(f"释放锁失败: {e}")
+    
+    def incr(self, key: str) -> Optional[int]:
+        """原子递增计数器，返回递增后的值"""
+        if not self.redis_client:
+            return None
+        try:
+            return self.redis_client.incr(key)
+        except Exception as e:
+            self.metrics.record_error(key)
+            logger.error(f"Redis INCR失败 {key}: {e}")
+            return None
+    
+    def publish(self, channel: str, message: str) -> int:
+        """发布消息，返回收到消息的订阅者数量"""
+        if not self.redis_client:
+            return 0
+        
+        try:
+            return self.redis_client.publish(channel, message)
+        except Exception as e:
+            logger.error(f"发布消息失败 {channel}: {e}")
+            return 0
 
 class CryptoCacheManager:
-    """加密货币缓存管理器"""
+    """加密货币缓存管理器
     
-    def __init__(self):
+    local_cache=True 时在Redis前增加进程内L1缓存（LRU+TTL），
+    配合 start_invalidation_listener() 订阅失效频道，
+    任意进程刷新缓存键后所有Web进程的L1副本都会被清除。
+    """
+    
+    def __init__(self, local_cache: bool = False, local_ttl: float = 30,
+                 local_max_entries: int = 512):
         self.redis = SimpleRedisManager()
         self.default_expire = 300  # 5分钟默认过期时间
+        self.local = LocalCache(local_max_entries, local_ttl) if local_cache else None
+        self._listener = None
+    
+    def _read(self, key: str, expire: int) -> Optional[Any]:
+        """先查L1再查Redis，Redis命中后回填L1（TTL不超过Redis中的过期时间）"""
+        token = None
+        if self.local is not None:
+            value = self.local.get(key)
+            if value is not None:
+                return value
+            token = self.local.token()
+        
+        value = self.redis.get(key)
+        if value is not None and self.local is not None:
+            self.local.set(key, value, min(expire, self.local.default_ttl), token=token)
+        return value
+    
+    def _write(self, key: str, value: Any, expire: int, codec: Optional[str] = None) -> bool:
+        """写入Redis并广播失效消息"""
+        result = self.redis.set(key, value, expire, codec=codec)
+        if result:
+            self.publish_invalidation([key])
+        return result
+    
+    def _write_many(self, mapping: Dict[str, Any], expire: int) -> bool:
+        """批量写入Redis并广播一条失效消息"""
+        result = self.redis.set_many(mapping, expire)
+        if result:
+            self.publish_invalidation(list(mapping))
+        return result
+    
+    def publish_invalidation(self, keys: List[str]):
+        """清除本进程L1中的键，并通知其他进程清除"""
+        if self.local is not None:
+            self.local.invalidate(keys)
+        self.redis.publish(INVALIDATION_CHANNEL, json.dumps(keys))
+    
+    def _on_invalidation_message(self, data: str):
+        """处理失效频道消息"""
+        if self.local is not None:
+            self.local.invalidate(parse_invalidation_message(data))
+    
+    def start_invalidation_listener(self):
+        """启动失效消息订阅线程（仅在启用L1时生效）"""
+        if self.local is None:
+            return
+        if self._listener is None:
+            self._listener = PubSubListener(
+                self.redis,
+                {INVALIDATION_CHANNEL: self._on_invalidation_message},
+                on_reconnect=self.local.clear
+            )
+        self._listener.start()
+    
+    def get_data_version(self, symbol: str, timeframe: str) -> int:
+        """获取 (币种, 时间周期) 的当前数据版本，从未递增过时为0
+        
+        回源数据库前先读取版本号，再把结果写入该版本的键，
+        避免读库期间入库流程发布的新版本被旧数据覆盖。
+        """
+        version = self._read(version_key(symbol, timeframe), self.default_expire)
+        try:
+            return int(version or 0)
+        except (TypeError, ValueError):
+            return 0
+    
+    def _reserve_version(self, symbol: str, timeframe: str, publish: bool) -> int:
+        return int(self.redis.redis_client.eval(
+            RESERVE_VERSION_SCRIPT, 2, version_seq_key(symbol, timeframe), version_key(symbol, timeframe),
+            '1' if publish else '0'))
+    
+    def reserve_data_version(self, symbol: str, timeframe: str) -> Optional[int]:
+        """预留一个新的数据版本号，写好该版本的键后调用 publish_data_version 发布
+        
+        预留期间发生的失效（bump_data_version）会分配更大的版本号，
+        之后发布较旧的预留版本不会覆盖它。
+        """
+        if not self.redis.redis_client:
+            return None
+        try:
+            return self._reserve_version(symbol, timeframe, publish=False)
+        except Exception as e:
+            logger.error(f"预留数据版本失败 {symbol} {timeframe}: {e}")
+            return None
+    
+    def publish_data_version(self, symbol: str, timeframe: str, version: int) -> bool:
+        """把预留的版本发布为当前版本，当前版本已更新时不发布"""
+        if not self.redis.redis_client:
+            return False
+        key = version_key(symbol, timeframe)
+        try:
+            published = bool(self.redis.redis_client.eval(PUBLISH_VERSION_SCRIPT, 1, key, version))
+        except Exception as e:
+            logger.error(f"发布数据版本失败 {symbol} {timeframe}: {e}")
+            return False
+        if published:
+            self.publish_invalidation([key])
+        return published
+    
+    def bump_data_version(self, symbol: str, timeframe: str) -> Optional[int]:
+        """分配并发布新的数据版本，之后的读取都会使用新版本的键"""
+        versions = self.bump_data_versions([(symbol, timeframe)])
+        return versions.get((symbol.upper(), timeframe))
+    
+    def bump_data_versions(self, pairs) -> Dict[tuple, int]:
+        """分配并发布多个 (币种, 时间周期) 的新数据版本，只广播一条失效消息"""
+        pairs = list(dict.fromkeys((symbol.upper(), timeframe) for symbol, timeframe in pairs))
+        if not pairs or not self.redis.redis_client:
+            return {}
+        
+        versions = {}
+        for symbol, timeframe in pairs:
+            try:
+                versions[(symbol, timeframe)] = self._reserve_version(symbol, timeframe, publish=True)
+            except Exception as e:
+                logger.error(f"递增数据版本失败 {symbol} {timeframe}: {e}")
+        
+        if versions:
+            self.publish_invalidation([version_key(symbol, timeframe) for symbol, timeframe in versions])
+        return versions
+    
+    def _versioned_key(self, symbol: str, namespace: str, timeframe: str, *parts,
+                       version: Optional[int] = None) -> str:
+        """生成带数据版本号的键，未指定版本时使用当前版本"""
+        if version is None:
+            version = self.get_data_version(symbol, timeframe)
+        return symbol_key(symbol, namespace, timeframe, *parts, f"v{version}")
     
     def cache_price(self, symbol: str, price_data: Dict) -> bool:
         """缓存价格数据"""
-        key = f"crypto:price:{symbol.upper()}"
-        return self.redis.set(key, price_data, self.default_expire)
+        key = symbol_key(symbol, "price")
+        return self._write(key, price_data, self.default_expire)
     
     def get_price(self, symbol: str) -> Optional[Dict]:
         """获取价格数据"""
-        key = f"crypto:price:{symbol.upper()}"
-        return self.redis.get(key)
+        key = symbol_key(symbol, "price")
+        return self._read(key, self.default_expire)
+    
+    def cache_chart_data(self, symbol: str, timeframe: str, data: list,
+                         version: Optional[int] = None, complete: bool = False) -> bool:
+        """缓存 (币种, 时间周期) 目前取到的最深图表窗口（按时间倒序）
+        
+        complete=True 表示数据库中的数据已全部在窗口内，更大的limit也无需回源。
+        """
+        if version is None:
+            version = self.get_data_version(symbol, timeframe)
+        key = self._versioned_key(symbol, "chart", timeframe, version=version)
+        # 图表数据缓存时间更长，使用列式二进制编码
+        result = self._write(key, data, 600, codec='columnar')  # 10分钟
+        if result and complete:
+            self._write(self._versioned_key(symbol, "chart", timeframe, "complete", version=version), 1, 600)
+        return result
+    
+    def get_chart_window(self, symbol: str, timeframe: str,
+                         version: Optional[int] = None) -> tuple:
+        """获取缓存的图表窗口，返回 (按时间倒序的行, 是否包含全部历史)"""
+        if version is None:
+            version = self.get_data_version(symbol, timeframe)
+        rows = self._read(self._versioned_key(symbol, "chart", timeframe, version=version), 600)
+        if not rows:
+            return None, False
+        complete = self._read(self._versioned_key(symbol, "chart", timeframe, "complete", version=version), 600)
+        return rows, bool(complete)
+    
+    def get_chart_data(self, symbol: str, timeframe: str, limit: Optional[int] = None,
+                       version: Optional[int] = None, start: Optional[str] = None,
+                       end: Optional[str] = None) -> Optional[list]:
+        """获取图表数据，任意不超过缓存窗口的limit或时间范围都从窗口中截取
+        
+        缓存窗口覆盖不了请求时返回None，调用方可以用 get_chart_window 增量扩展窗口。
+        """
+        rows, complete = self.get_chart_window(symbol, timeframe, version)
+        if not rows:
+            return None
+        if not complete:
+            if start is not None and start < rows[-1]['date']:
+                return None
+            if start is None and limit is not None and len(rows) < limit:
+                return None
+        return slice_chart_rows(rows, limit, start, end)
+    
+    def cache_kline_data(self, symbol: str, timeframe: str, kline: list,
+                         version: Optional[int] = None) -> bool:
+        """缓存K线数组 [[timestamp, open, high, low, close, volume], ...]"""
+        key = self._versioned_key(symbol, "kline", timeframe, version=version)
+        return self._write(key, kline, 60, codec='columnar')  # 1分钟
+    
+    def get_kline_data(self, symbol: str, timeframe: str,
+                       version: Optional[int] = None) -> Optional[list]:
+        """获取K线数组"""
+        key = self._versioned_key(symbol, "kline", timeframe, version=version)
+        return self._read(key, 60)
+    
+    def cache_kline_payload(self, symbol: str, timeframe: str, limit: int, payload: Dict,
+                            version: Optional[int] = None) -> bool:
+        """缓存K线及技术指标的API结果"""
+        key = self._versioned_key(symbol, "kline_payload", timeframe, limit, version=version)
+        return self._write(key, payload, 600)  # 10分钟
     
-    def cache_chart_data(self, symbol: str, timeframe: str, data: list) -> bool:
-        """缓存图表数据"""
-        key = f"crypto:chart:{symbol.upper()}:{timeframe}"
-        # 图表数据缓存时间更长
-        return self.redis.set(key, data, 600)  # 10分钟
+    def get_kline_payload(self, symbol: str, timeframe: str, limit: int,
+                          version: Optional[int] = None) -> Optional[Dict]:
+        """获取K线及技术指标的API结果"""
+        key = self._versioned_key(symbol, "kline_payload", timeframe, limit, version=version)
+        return self._read(key, 600)
     
-    def get_chart_data(self, symbol: str, timeframe: str) -> Optional[list]:
-        """获取图表数据"""
-        key = f"crypto:chart:{symbol.upper()}:{timeframe}"
-        return self.redis.get(key)
+    @staticmethod
+    def indicator_result_key(symbol: str, timeframe: str, watermark, params: Dict) -> str:
+        """指标计算结果的缓存键: 按最后一根K线的时间戳（数据水位）和指标参数区分
+        
+        新K线入库后水位变化，自然使用新的键，无需主动失效。
+        """
+        digest = hashlib.sha1(json.dumps(params, sort_keys=True, default=str,
+                                         separators=(',', ':')).encode('utf-8')).hexdigest()[:16]
+        return symbol_key(symbol, "indicators", timeframe, watermark, digest)
+    
+    def get_or_compute(self, key: str, compute, expire: int, lock_timeout: int = 10) -> Any:
+        """读取缓存，未命中时只有一个调用方执行compute并写入，其他调用方等待结果"""
+        value = self._read(key, expire)
+        if value is not None:
+            return value
+        if not self.redis.redis_client:
+            return compute()
+        
+        def compute_and_store():
+            result = compute()
+            if not _is_empty_result(result):
+                self._write(key, result, expire)
+            return result
+        
+        def read_result():
+            result = self.redis.get(key)
+            return _MISSING if result is None else result
+        
+        return single_flight(self.redis, key, compute_and_store, read_result, lock_timeout, fallback=compute)
     
     def cache_latest_prices(self, prices: list) -> bool:
         """缓存最新价格列表"""
         key = "crypto:latest_prices"
-        return self.redis.set(key, prices, 60)  # 1分钟
+        return self._write(key, prices, 60)  # 1分钟
     
     def get_latest_prices(self) -> Optional[list]:
         """获取最新价格列表"""
         key = "crypto:latest_prices"
-        return self.redis.get(key)
+        return self._read(key, 60)
     
     def cache_realtime_prices(self, prices: list) -> bool:
         """缓存实时价格列表（与历史数据分离）"""
         key = "crypto:realtime_prices"
-        return self.redis.set(key, prices, 30)  # 30秒过期，更短的缓存时间
+        return self._write(key, prices, 30)  # 30秒过期，更短的缓存时间
     
     def get_realtime_prices(self) -> Optional[list]:
         """获取实时价格列表"""
         key = "crypto:realtime_prices"
-        return self.redis.get(key)
+        return self._read(key, 30)
     
     def cache_realtime_price(self, symbol: str, price_data: Dict) -> bool:
         """缓存单个币种的实时价格数据"""
-        key = f"crypto:realtime:{symbol.upper()}"
-        return self.redis.set(key, price_data, 30)  # 30秒过期
+        key = symbol_key(symbol, "realtime")
+        return self._write(key, price_data, 30)  # 30秒过期
     
     def get_realtime_price(self, symbol: str) -> Optional[Dict]:
         """获取单个币种的实时价格数据"""
-        key = f"crypto:realtime:{symbol.upper()}"
-        return self.redis.get(key)
+        key = symbol_key(symbol, "realtime")
+        return self._read(key, 30)
+    
+    def cache_realtime_batch(self, prices: list) -> bool:
+        """一次往返缓存实时价格列表及每个币种的实时数据"""
+        mapping = {"crypto:realtime_prices": prices}
+        for price_data in prices:
+            mapping[symbol_key(price_data['symbol'], "realtime")] = price_data
+        return self._write_many(mapping, 30)  # 30秒过期
+    
+    def get_realtime_price_many(self, symbols: List[str]) -> Dict[str, Dict]:
+        """批量获取多个币种的实时价格数据，按币种返回"""
+        keys = {symbol_key(symbol, "realtime"): symbol.upper() for symbol in symbols}
+        cached = self.redis.get_many(list(keys))
+        return {keys[key]: value for key, value in cached.items()}
+    
+    def cache_price_many(self, prices: Dict[str, Dict]) -> bool:
+        """批量缓存多个币种的价格数据"""
+        mapping = {symbol_key(symbol, "price"): data for symbol, data in prices.items()}
+        return self._write_many(mapping, self.default_expire)
+    
+    def get_price_many(self, symbols: List[str]) -> Dict[str, Dict]:
+        """批量获取多个币种的价格数据，按币种返回"""
+        keys = {symbol_key(symbol, "price"): symbol.upper() for symbol in symbols}
+        cached = self.redis.get_many(list(keys))
+        return {keys[key]: value for key, value in cached.items()}
+    
+    @staticmethod
+    def _parse_versioned_key(key: str) -> Optional[tuple]:
+        """从带版本号的键或版本计数器键中解析出 (币种, 时间周期)"""
+        parts = key.split(':')
+        if len(parts) < 4 or not parts[1].startswith('{'):
+            return None
+        if parts[2] in VERSIONED_NAMESPACES or parts[2] in ('version', 'version_seq'):
+            return parts[1].strip('{}'), parts[3]
+        return None
     
     def invalidate_symbol(self, symbol: str):
-        """清除某个币种的所有缓存"""
+        """使某个币种的所有缓存失效
+        
+        带版本号的图表/K线缓存通过递增版本失效，其余键直接删除。
+        """
         if not self.redis.is_connected():
             return
         
         try:
-            # 由于是单节点Redis，使用keys命令查找
-            pattern = f"crypto:*:{symbol.upper()}*"
-            keys = self.redis.redis_client.keys(pattern)
-            if keys:
-                self.redis.delete(*keys)
-                logger.info(f"清除 {symbol} 相关缓存: {len(keys)} 个键")
+            # 同一币种的键共享哈希标签，集群模式下也位于同一槽位
+            keys = self.redis.scan_keys(symbol_key(symbol, "*"))
+            versioned = {self._parse_versioned_key(key) for key in keys} - {None}
+            unversioned = [key for key in keys if self._parse_versioned_key(key) is None]
+            if versioned:
+                self.bump_data_versions(versioned)
+            if unversioned:
+                self.redis.delete(*unversioned)
+                self.publish_invalidation(unversioned)
+            logger.info(f"清除 {symbol} 相关缓存: 递增 {len(versioned)} 个数据版本，删除 {len(unversioned)} 个键")
         except Exception as e:
             logger.error(f"清除缓存失败: {e}")
     
     def get_cache_stats(self) -> dict:
-        """获取缓存统计信息"""
+        """获取缓存统计信息（键数量、内存以及本进程的命中率和延迟指标）"""
         if not self.redis.is_connected():
             return {
                 'connected': False,
                 'total_keys': 0,
                 'price_keys': 0,
                 'chart_keys': 0,
-                'memory_usage': 'N/A'
+                'memory_usage': 'N/A',
+                'metrics': self.redis.metrics.snapshot()
             }
         
         try:
-            # 获取所有crypto相关的键
-            all_keys = self.redis.redis_client.keys("crypto:*")
-            price_keys = self.redis.redis_client.keys("crypto:price:*")
-            chart_keys = self.redis.redis_client.keys("crypto:chart:*")
+            # 使用SCAN遍历一次，按命名空间计数，避免KEYS阻塞Redis
+            keys_by_namespace = {}
+            total_keys = 0
+            for key in self.redis.redis_client.scan_iter(match="crypto:*", count=500):
+                total_keys += 1
+                namespace = namespace_of(key)
+                keys_by_namespace[namespace] = keys_by_namespace.get(namespace, 0) + 1
             
             # 获取内存使用情况
-            info = self.redis.redis_client.info('memory')
+            info = self.redis.info('memory')
             memory_usage = info.get('used_memory_human', 'N/A')
             
-            return {
+            stats = {
                 'connected': True,
-                'total_keys': len(all_keys),
-                'price_keys': len(price_keys),
-                'chart_keys': len(chart_keys),
+                'total_keys': total_keys,
+                'price_keys': keys_by_namespace.get('price', 0),
+                'chart_keys': keys_by_namespace.get('chart', 0),
+                'keys_by_namespace': keys_by_namespace,
                 'memory_usage': memory_usage,
-                'redis_version': self.redis.redis_client.info('server').get('redis_version', 'Unknown')
+                'redis_version': self.redis.info('server').get('redis_version', 'Unknown'),
+                'cluster': self.redis.cluster,
+                'metrics': self.redis.metrics.snapshot()
             }
+            if self.local is not None:
+                stats['local_cache'] = self.local.stats()
+            return stats
         except Exception as e:
             logger.error(f"获取缓存统计失败: {e}")
             return {
                 'connected': False,
-                'error': str(e)
+                'error': str(e),
+                'metrics': self.redis.metrics.snapshot()
             }
     
     def clear_price_cache(self) -> bool:
@@ -259,10 +801,11 @@ class CryptoCacheManager:
             return False
         
         try:
-            keys = self.redis.redis_client.keys("crypto:price:*")
-            keys.extend(self.redis.redis_client.keys("crypto:latest_prices"))
+            keys = self.redis.scan_keys("crypto:*:price")
+            keys.extend(self.redis.scan_keys("crypto:latest_prices"))
             if keys:
                 deleted = self.redis.delete(*keys)
+                self.publish_invalidation(list(keys))
                 logger.info(f"清除价格缓存: {deleted} 个键")
                 return True
             return True
@@ -271,16 +814,20 @@ class CryptoCacheManager:
             return False
     
     def clear_chart_cache(self) -> bool:
-        """清除所有图表缓存"""
+        """使所有图表/K线缓存失效（递增数据版本，旧版本的键随TTL过期）"""
         if not self.redis.is_connected():
             return False
         
         try:
-            keys = self.redis.redis_client.keys("crypto:chart:*")
-            if keys:
-                deleted = self.redis.delete(*keys)
-                logger.info(f"清除图表缓存: {deleted} 个键")
-                return True
+            pairs = set()
+            for namespace in VERSIONED_NAMESPACES:
+                for key in self.redis.scan_keys(f"crypto:*:{namespace}:*"):
+                    pair = self._parse_versioned_key(key)
+                    if pair:
+                        pairs.add(pair)
+            if pairs:
+                self.bump_data_versions(pairs)
+                logger.info(f"清除图表缓存: 递增 {len(pairs)} 个数据版本")
             return True
         except Exception as e:
             logger.error(f"清除图表缓存失败: {e}")
@@ -292,9 +839,10 @@ class CryptoCacheManager:
             return False
         
         try:
-            keys = self.redis.redis_client.keys("crypto:*")
+            keys = self.redis.scan_keys("crypto:*")
             if keys:
                 deleted = self.redis.delete(*keys)
+                self.publish_invalidation(list(keys))
                 logger.info(f"清除所有缓存: {deleted} 个键")
                 return True
             return True
@@ -302,32 +850,127 @@ class CryptoCacheManager:
             logger.error(f"清除所有缓存失败: {e}")
             return False
 
-def cache_result(expire: int = 300):
-    """缓存装饰器"""
+def _is_empty_result(result: Any) -> bool:
+    """判断结果是否为空（None、空列表、空字典、空字符串）"""
+    return result is None or (isinstance(result, (list, dict, tuple, str)) and len(result) == 0)
+
+_MISSING = object()
+
+def single_flight(redis, key: str, compute, read, lock_timeout: int = 10, name: Optional[str] = None,
+                  fallback=None) -> Any:
+    """单飞锁：只有拿到锁的调用方执行compute（负责写入缓存），其他调用方轮询read等待其结果
+    
+    read 返回 _MISSING 表示结果尚未写入；等待超过lock_timeout后直接执行compute。
+    Redis不可用时不等待，直接执行fallback（只计算不写缓存，默认为compute）。
+    """
+    fallback = fallback or compute
+    lock = redis.acquire_lock(f"lock:{key}", lock_timeout)
+    if lock is False:
+        return fallback()
+    if lock:
+        try:
+            return compute()
+        finally:
+            redis.release_lock(lock)
+    
+    # 其他调用方正在计算，等待其写入结果
+    deadline = time.time() + lock_timeout
+    delay = 0.05
+    while time.time() < deadline:
+        time.sleep(delay)
+        delay = min(delay * 2, 0.5)
+        value = read()
+        if value is not _MISSING:
+            return value
+        if not redis.is_connected():
+            logger.warning(f"等待缓存计算时Redis不可用，直接计算: {name or key}")
+            return fallback()
+    
+    logger.warning(f"等待缓存计算超时，直接计算: {name or key}")
+    return compute()
+
+def make_cache_key(func, args: tuple, kwargs: dict, ignore_self: bool = False) -> str:
+    """生成稳定的函数缓存键
+    
+    参数按JSON规范化（kwargs按名称排序）后做SHA1，
+    不依赖 str() 的输出，跨进程、跨重启保持一致。
+    """
+    if ignore_self:
+        args = args[1:]
+    payload = json.dumps([list(args), sorted(kwargs.items())], sort_keys=True,
+                         default=str, ensure_ascii=False, separators=(',', ':'))
+    digest = hashlib.sha1(payload.encode('utf-8')).hexdigest()
+    return f"func:{func.__module__}.{func.__qualname__}:{digest}"
+
+def memoize(expire: int = 300, stale_ttl: int = 0, negative_expire: int = 30,
+            lock_timeout: int = 10, ignore_self: bool = False):
+    """防击穿的缓存装饰器
+    
+    - 复用全局缓存管理器的Redis连接
+    - 参数稳定哈希生成缓存键
+    - 单飞锁：缓存失效时只有一个调用方重新计算，其他调用方等待结果
+    - stale_ttl > 0 时过期后仍可在stale_ttl秒内返回旧值，同时后台刷新
+    - 空结果使用较短的 negative_expire 缓存，避免反复穿透
+    
+    缓存值以 {'v': 结果, 'fresh_until': 时间戳} 的形式存储，结果需可JSON序列化。
+    """
     def decorator(func):
+        @functools.wraps(func)
         def wrapper(*args, **kwargs):
-            # 生成缓存键
-            cache_key = f"func:{func.__name__}:{hashlib.md5(str(args + tuple(kwargs.items())).encode()).hexdigest()}"
+            redis = get_cache_manager().redis
+            if not redis.redis_client:
+                return func(*args, **kwargs)
             
-            # 尝试从缓存获取
-            cache_manager = SimpleRedisManager()
-            cached_result = cache_manager.get(cache_key)
+            cache_key = make_cache_key(func, args, kwargs, ignore_self)
+            lock_name = f"lock:{cache_key}"
             
-            if cached_result is not None:
-                logger.info(f"缓存命中: {func.__name__}")
-                return cached_result
+            def compute_and_store():
+                result = func(*args, **kwargs)
+                if _is_empty_result(result):
+                    fresh_for, keep_for = negative_expire, negative_expire
+                else:
+                    fresh_for, keep_for = expire, expire + stale_ttl
+                if keep_for > 0:
+                    redis.set(cache_key, {'v': result, 'fresh_until': time.time() + fresh_for}, keep_for)
+                return result
             
-            # 执行函数
-            result = func(*args, **kwargs)
+            def refresh_in_background(lock):
+                try:
+                    compute_and_store()
+                    logger.info(f"后台刷新缓存完成: {func.__name__}")
+                except Exception as e:
+                    logger.error(f"后台刷新缓存失败 {func.__name__}: {e}")
+                finally:
+                    redis.release_lock(lock)
             
-            # 缓存结果
-            cache_manager.set(cache_key, result, expire)
-            logger.info(f"缓存结果: {func.__name__}")
+            envelope = redis.get(cache_key)
+            if isinstance(envelope, dict) and 'v' in envelope:
+                if time.time() < envelope.get('fresh_until', 0):
+                    logger.debug(f"缓存命中: {func.__name__}")
+                    return envelope['v']
+                if stale_ttl > 0:
+                    # 返回旧值，只有拿到锁的调用方负责后台刷新
+                    lock = redis.acquire_lock(lock_name, lock_timeout)
+                    if lock:
+                        threading.Thread(target=refresh_in_background, args=(lock,), daemon=True).start()
+                    return envelope['v']
             
-            return result
+            def read_fresh():
+                envelope = redis.get(cache_key)
+                if isinstance(envelope, dict) and 'v' in envelope and time.time() < envelope.get('fresh_until', 0):
+                    return envelope['v']
+                return _MISSING
+            
+            # Redis不可用时直接执行函数，不等待锁也不写缓存
+            return single_flight(redis, cache_key, compute_and_store, read_fresh, lock_timeout, func.__name__,
+                                 fallback=lambda: func(*args, **kwargs))
         return wrapper
     return decorator
 
+def cache_result(expire: int = 300):
+    """缓存装饰器（兼容旧接口，等价于 memoize(expire=expire)）"""
+    return memoize(expire=expire)
+
 # 全局缓存管理器实例
 _cache_manager = None
 
@@ -359,7 +1002,7 @@ if __name__ == "__main__":
         print(f"✅ 从缓存获取BTC价格: ${cached_btc['price']}")
     
     # 测试装饰器
-    @cache_result(expire=60)
+    @memoize(expire=60, stale_ttl=30)
     def get_market_data(symbol):
         print(f"正在获取 {symbol} 市场数据...")
         return {"symbol": symbol, "data": "market_data", "timestamp": time.time()}
@@ -70,6 +70,7 @@ function calculateLineIntersection(x1, y1, x2, y2, horizontalY) {
 let priceChart = null;
 let previousPrices = {}; // 存储上一次的价格数据
 let priceUpdateInterval = null; // 价格更新定时器
+let priceEventSource = null; // 价格推送连接
 let lastUpdateTime = null;
 let apiUsageInfo = null;
 
@@ -636,11 +637,8 @@ function startOptimizedUpdates() {
         clearInterval(priceUpdateInterval);
     }
     
-    // 价格显示更新：每30秒检查一次
-    priceUpdateInterval = setInterval(() => {
-        loadLatestPrices();
-        updateLastUpdated();
-    }, 30000);
+    // 价格显示更新：优先使用服务器推送，不可用时每30秒检查一次
+    startPriceStream();
     
     // 图表数据更新：每5分钟更新一次
     setInterval(() => {
@@ -648,12 +646,52 @@ function startOptimizedUpdates() {
     }, 300000);
     
     console.log('⏰ 优化更新策略已启动');
-    console.log('   - 价格显示: 每30秒更新');
+    console.log(priceEventSource ? '   - 价格显示: 服务器推送' : '   - 价格显示: 每30秒更新');
     console.log('   - 图表数据: 每5分钟更新');
 }
 
+// 订阅服务器推送的价格，浏览器不支持或推送不可用时回退到轮询
+function startPriceStream() {
+    if (priceEventSource) {
+        priceEventSource.close();
+    }
+    if (!window.EventSource) {
+        startPricePolling();
+        return;
+    }
+    
+    priceEventSource = new EventSource('/api/stream/prices');
+    priceEventSource.addEventListener('prices', event => {
+        const message = JSON.parse(event.data);
+        displayPrices(message.data);
+        updateLastUpdated();
+    });
+    priceEventSource.onerror = () => {
+        // 网络中断时浏览器会自动重连，只有连接被拒绝（CLOSED）时才回退到轮询
+        if (priceEventSource && priceEventSource.readyState === EventSource.CLOSED) {
+            priceEventSource = null;
+            startPricePolling();
+        }
+    };
+}
+
+// 轮询更新价格
+function startPricePolling() {
+    if (priceUpdateInterval) {
+        clearInterval(priceUpdateInterval);
+    }
+    priceUpdateInterval = setInterval(() => {
+        loadLatestPrices();
+        updateLastUpdated();
+    }, 30000);
+}
+
 // 停止实时价格更新
 function stopRealTimePriceUpdates() {
+    if (priceEventSource) {
+        priceEventSource.close();
+        priceEventSource = null;
+    }
     if (priceUpdateInterval) {
         clearInterval(priceUpdateInterval);
         priceUpdateInterval = null;
@@ -664,8 +702,8 @@ function stopRealTimePriceUpdates() {
 function handleVisibilityChange() {
     if (document.hidden) {
         // 页面隐藏时暂停更新
-        if (priceUpdateInterval) {
-            clearInterval(priceUpdateInterval);
+        if (priceUpdateInterval || priceEventSource) {
+            stopRealTimePriceUpdates();
             console.log('⏸️ 页面隐藏，暂停更新');
         }
     } else {
@@ -678,9 +716,7 @@ function handleVisibilityChange() {
 
 // 页面卸载时清理
 window.addEventListener('beforeunload', function() {
-    if (priceUpdateInterval) {
-        clearInterval(priceUpdateInterval);
-    }
+    stopRealTimePriceUpdates();
 });
 
 // 页面加载完成后初始化
@@ -7,6 +7,7 @@ let volumeChart = null;
 let volatilityChart = null;
 let previousEthPrice = null; // 存储上一次的ETH价格
 let priceUpdateInterval = null; // 价格更新定时器
+let priceEventSource = null; // 价格推送连接
 
 // 计算曲线与平均值的交点并创建分段数据
 function calculateIntersectionSegments(data, averagePrice) {
@@ -81,8 +82,31 @@ document.addEventListener('DOMContentLoaded', function() {
     startRealTimePriceUpdates();
 });
 
-// 启动实时价格更新
+// 启动实时价格更新：优先使用服务器推送，浏览器不支持或推送不可用时回退到轮询
 function startRealTimePriceUpdates() {
+    stopRealTimePriceUpdates();
+    
+    if (!window.EventSource) {
+        startPricePolling();
+        return;
+    }
+    
+    priceEventSource = new EventSource('/api/stream/prices');
+    priceEventSource.addEventListener('prices', event => {
+        const message = JSON.parse(event.data);
+        displayEthereumPrice(message.data);
+    });
+    priceEventSource.onerror = () => {
+        // 网络中断时浏览器会自动重连，只有连接被拒绝（CLOSED）时才回退到轮询
+        if (priceEventSource && priceEventSource.readyState === EventSource.CLOSED) {
+            priceEventSource = null;
+            startPricePolling();
+        }
+    };
+}
+
+// 轮询更新价格
+function startPricePolling() {
     // 清除现有的定时器
     if (priceUpdateInterval) {
         clearInterval(priceUpdateInterval);
@@ -96,6 +120,10 @@ function startRealTimePriceUpdates() {
 
 // 停止实时价格更新
 function stopRealTimePriceUpdates() {
+    if (priceEventSource) {
+        priceEventSource.close();
+        priceEventSource = null;
+    }
     if (priceUpdateInterval) {
         clearInterval(priceUpdateInterval);
         priceUpdateInterval = null;
@@ -5,6 +5,9 @@ let klineChart = null;
 let rsiChart = null;
 let macdChart = null;
 let isFullscreen = false;
+const KLINE_LIMIT = 100;
+// 当前图表的K线和指标数据，刷新时只请求最后一根K线之后的数据并合并
+let klineState = null;
 
 // 初始化页面
 document.addEventListener('DOMContentLoaded', function() {
@@ -13,7 +16,7 @@ document.addEventListener('DOMContentLoaded', function() {
     loadKlineData();
     
     // 每30秒自动刷新数据
-    setInterval(loadKlineData, 30000);
+    setInterval(() => loadKlineData(), 30000);
 });
 
 // 初始化图表
@@ -35,21 +38,109 @@ function initializeCharts() {
     });
 }
 
-// 加载K线数据
+// 把列式K线 {t, o, h, l, c, v} 转换为 [时间戳, 开, 高, 低, 收, 量] 数组
+function columnsToKline(columns) {
+    return columns.t.map((time, index) => [
+        time, columns.o[index], columns.h[index], columns.l[index], columns.c[index], columns.v[index]
+    ]);
+}
+
+// 截取指标序列（递归处理布林带、KDJ等嵌套指标）
+function sliceIndicators(indicators, start, end) {
+    const result = {};
+    Object.keys(indicators).forEach(key => {
+        const value = indicators[key];
+        result[key] = Array.isArray(value) ? value.slice(start, end) : sliceIndicators(value, start, end);
+    });
+    return result;
+}
+
+// 拼接指标序列
+function concatIndicators(base, tail) {
+    const result = {};
+    Object.keys(tail).forEach(key => {
+        const value = tail[key];
+        if (Array.isArray(value)) {
+            result[key] = (base[key] || []).concat(value);
+        } else {
+            result[key] = concatIndicators(base[key] || {}, value);
+        }
+    });
+    return result;
+}
+
+// 按时间戳合并增量数据：替换时间戳相同的K线（未收盘K线的更新），追加新K线，保留最近KLINE_LIMIT根
+// 增量数据的指标从同一窗口起点开始计算，与已有指标可以直接拼接
+function mergeKlineData(state, update) {
+    if (!update.kline.length) {
+        return state;
+    }
+    
+    const firstTime = update.kline[0][0];
+    let keep = state.kline.length;
+    while (keep > 0 && state.kline[keep - 1][0] >= firstTime) {
+        keep--;
+    }
+    
+    const kline = state.kline.slice(0, keep).concat(update.kline);
+    const indicators = concatIndicators(sliceIndicators(state.indicators, 0, keep), update.indicators);
+    const start = Math.max(0, kline.length - KLINE_LIMIT);
+    return {
+        symbol: state.symbol,
+        timeframe: state.timeframe,
+        windowStart: state.windowStart,
+        kline: kline.slice(start),
+        indicators: sliceIndicators(indicators, start)
+    };
+}
+
+// 加载K线数据：首次加载完整数据，之后只请求最后一根K线及之后的数据；
+// 增量请求带上窗口起点，服务器从同一起点计算指标，窗口过长时服务器返回完整数据（window_start改变）
 async function loadKlineData() {
+    const symbol = currentSymbol;
+    const timeframe = currentTimeframe;
+    const incremental = klineState && klineState.symbol === symbol &&
+        klineState.timeframe === timeframe && klineState.kline.length > 0;
+    
     try {
-        showLoading(true);
+        showLoading(!incremental);
         
-        const response = await fetch(`/api/kline_data?symbol=${currentSymbol}&timeframe=${currentTimeframe}&limit=100`);
+        let url = `/api/kline_data?symbol=${symbol}&timeframe=${timeframe}&limit=${KLINE_LIMIT}&format=columns`;
+        if (incremental) {
+            url += `&since=${klineState.kline[klineState.kline.length - 1][0]}&start=${klineState.windowStart}`;
+        }
+        const response = await fetch(url);
         const result = await response.json();
         
-        if (result.success && result.data) {
-            updateCharts(result.data);
-            updateIndicators(result.data.indicators);
-            updatePriceInfo(result.data.kline);
+        // 请求期间切换了币种或周期，丢弃过期的结果
+        if (symbol !== currentSymbol || timeframe !== currentTimeframe) {
+            return;
+        }
+        
+        if (result.success && result.data && !result.data.error) {
+            const update = {
+                kline: columnsToKline(result.data.kline),
+                indicators: result.data.indicators
+            };
+            if (incremental && result.data.window_start === klineState.windowStart) {
+                klineState = mergeKlineData(klineState, update);
+            } else {
+                klineState = {
+                    symbol: symbol,
+                    timeframe: timeframe,
+                    windowStart: result.data.window_start,
+                    kline: update.kline,
+                    indicators: update.indicators
+                };
+            }
+            
+            updateCharts(klineState);
+            updateIndicators(klineState.indicators);
+            updatePriceInfo(klineState.kline);
         } else {
-            console.error('获取K线数据失败:', result.error);
-            showError('获取K线数据失败: ' + (result.error || '未知错误'));
+            const error = result.error || (result.data && result.data.error);
+            console.error('获取K线数据失败:', error);
+            showError('获取K线数据失败: ' + (error || '未知错误'));
         }
     } catch (error) {
         console.error('加载K线数据时出错:', error);